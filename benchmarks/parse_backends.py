@@ -0,0 +1,73 @@
+"""
+Сравнение разборщиков XML для учебных планов: проверка, что lxml и стандартная
+библиотека дают одинаковые планы, и замер скорости на каждом файле.
+
+Запуск: python benchmarks/parse_backends.py <план>.plx [<план>.plx ...] [-r повторов]
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from enigma.education_plan import BACKEND_ETREE, BACKEND_LXML, EducationPlan, lxml_etree
+from enigma.plan_diff import diff_plans
+
+
+def check_parity(plans: Dict[str, EducationPlan]) -> List[str]:
+    """ Список расхождений между планами, прочитанными разными разборщиками """
+    problems = []
+    reference = plans[BACKEND_ETREE]
+    for backend, plan in plans.items():
+        diff = diff_plans(reference, plan)
+        if not diff.is_empty():
+            problems.append(f'{backend}: {diff.to_dict()}')
+        if reference.subject_keys.keys() != plan.subject_keys.keys():
+            problems.append(f'{backend}: не совпадают коды дисциплин')
+        if reference.competence_keys.keys() != plan.competence_keys.keys():
+            problems.append(f'{backend}: не совпадают коды компетенций')
+        parents = {key: subj.parent for key, subj in plan.subject_keys.items()}
+        if parents != {key: subj.parent for key, subj in reference.subject_keys.items()}:
+            problems.append(f'{backend}: не совпадают родители дисциплин')
+    return problems
+
+
+def measure(filename: str, backend: str, repeat: int) -> float:
+    """ Лучшее время чтения плана из нескольких повторов, с """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        EducationPlan(filename, backend).load()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('plans', nargs='+', help='Файлы *.plx')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Число повторов замера')
+    args = parser.parse_args()
+
+    backends = [BACKEND_ETREE] + ([BACKEND_LXML] if lxml_etree is not None else [])
+    failed = False
+    for filename in args.plans:
+        plans = {backend: EducationPlan(filename, backend).load() for backend in backends}
+        problems = check_parity(plans)
+        failed = failed or bool(problems)
+        timings = {backend: measure(filename, backend, args.repeat) for backend in backends}
+        size = os.path.getsize(filename) / 1024 / 1024
+        line = f'{filename} ({size:.1f} МБ): ' + ', '.join(f'{b} {t:.3f} с' for b, t in timings.items())
+        if BACKEND_LXML in timings:
+            line += f', ускорение x{timings[BACKEND_ETREE] / timings[BACKEND_LXML]:.2f}'
+        print(line)
+        for problem in problems:
+            print('  РАСХОЖДЕНИЕ ' + problem)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
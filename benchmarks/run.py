@@ -0,0 +1,220 @@
+"""
+Замеры скорости на синтетических данных нескольких размеров (см. benchmarks/synthetic.py):
+чтение учебного плана, связывание дисциплин с компетенциями, генерация матрицы
+компетенций и РПД, чтение РПД для ФОС.
+
+Запуск: python benchmarks/run.py [-s small medium] [-r 3] [-o results.json] [-b baseline.json]
+Результаты пишутся в JSON; с ключом -b они сравниваются с прошлым прогоном и
+замеры, ставшие медленнее порога, перечисляются в выводе
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+import extractor2
+import get_fos
+import get_matrix
+import get_rpd
+from benchmarks.synthetic import Scale, write_corpus
+from enigma.education_plan import (
+    LOADER_VERSION, SECTION_COMPETENCES, SECTION_SUBJECTS, EducationPlan, iter_plan,
+)
+from enigma.rpd_index import RpdIndex
+
+SCALES = {
+    'small': Scale(subjects=60, competences=20, indicators=3, links=3, courses=3, rpds=10),
+    'medium': Scale(subjects=600, competences=40, indicators=4, links=4, courses=5, rpds=30),
+    'large': Scale(subjects=3000, competences=60, indicators=5, links=5, courses=5, rpds=60),
+}
+
+RESULTS_VERSION = 1  # увеличивать при изменении формата файла результатов
+DEFAULT_THRESHOLD = 1.2  # во сколько раз замер может стать медленнее, прежде чем считаться регрессией
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """ Время выполнения func в нескольких повторах, с; вывод на экран подавляется """
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'times': times,
+    }
+
+
+@contextlib.contextmanager
+def working_dir(path: str):
+    """ Временно сменить текущий каталог: шаблоны и РПД ищутся относительно него """
+    old_path = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old_path)
+
+
+def bench_load(paths: Dict[str, List[str]], repeat: int) -> Dict[str, Any]:
+    """ Чтение плана целиком """
+    return measure(lambda: EducationPlan(paths['plan'][0]).load(), repeat)
+
+
+def bench_read_links(paths: Dict[str, List[str]], repeat: int) -> Dict[str, Any]:
+    """ Связывание дисциплин с компетенциями по уже прочитанным строкам связей """
+    filename = paths['plan'][0]
+    plan = EducationPlan(filename).load(SECTION_COMPETENCES, SECTION_SUBJECTS)
+    links = [attrs for tag, _, attrs in iter_plan(filename) if tag == 'ПланыКомпетенцииДисциплины']
+    return measure(lambda: plan.read_links(links), repeat)
+
+
+def bench_get_matrix(paths: Dict[str, List[str]], repeat: int) -> Dict[str, Any]:
+    """ Матрица компетенций без кэша планов """
+    return measure(lambda: get_matrix.main(paths['plan'][0], use_cache=False), repeat)
+
+
+def bench_get_rpd(paths: Dict[str, List[str]], repeat: int) -> Dict[str, Any]:
+    """ Генерация РПД по всем синтетическим курсам, план читается заново для каждого курса """
+    output_dir = os.path.dirname(paths['plan'][0])
+
+    def run() -> None:
+        for course in paths['courses']:
+            args = argparse.Namespace(
+                plan=paths['plan'][0], course=course, title_dir=None, lit_dir=None,
+                output_file=os.path.join(output_dir, 'rpd.docx'), no_cache=True, cache_dir=None,
+                force=True,  # иначе по манифесту сборки повторы замера ничего бы не создавали
+            )
+            get_rpd.main(args)
+
+    with working_dir(ROOT):
+        return measure(run, repeat)
+
+
+def bench_get_rpd_dict(paths: Dict[str, List[str]], repeat: int) -> Dict[str, Any]:
+    """ Чтение результатов обучения из каталога РПД для ФОС, индекс РПД каждый раз строится заново """
+    plan = EducationPlan(paths['plan'][0]).load()
+    rpd_dir = os.path.dirname(paths['rpds'][0]) if paths['rpds'] else ''
+    return measure(lambda: get_fos.get_rpd_dict(plan, RpdIndex(rpd_dir, use_cache=False)), repeat)
+
+
+def bench_find_rpd(paths: Dict[str, List[str]], repeat: int) -> Dict[str, Any]:
+    """ Поиск РПД и разбор критериев оценивания по каждой дисциплине, для которой РПД есть """
+    plan = EducationPlan(paths['plan'][0]).load()
+    stems = [os.path.splitext(os.path.basename(filename))[0] for filename in paths['rpds']]
+    subjects = [plan.subject_codes[stem.split(' ', 1)[0]] for stem in stems]
+
+    def run() -> None:
+        index = RpdIndex(os.path.dirname(paths['rpds'][0]), use_cache=False)
+        for subject in subjects:
+            extractor2.find_rpd(index, subject.code, subject.name, 'Экзамен', '', 0)
+
+    with working_dir(os.path.dirname(paths['plan'][0])):
+        return measure(run, repeat)
+
+
+BENCHMARKS = {
+    'load_plan': bench_load,
+    'read_links': bench_read_links,
+    'get_matrix.main': bench_get_matrix,
+    'get_rpd.main': bench_get_rpd,
+    'get_fos.get_rpd_dict': bench_get_rpd_dict,
+    'extractor2.find_rpd': bench_find_rpd,
+}
+
+
+def get_commit() -> str:
+    """ Текущий коммит репозитория, если он доступен """
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return result.stdout.strip()
+
+
+def run_scale(name: str, scale: Scale, benchmarks: List[str], repeat: int) -> Dict[str, Any]:
+    """ Сгенерировать данные одного размера и выполнить на них замеры """
+    with tempfile.TemporaryDirectory(prefix='enigma-bench-') as directory:
+        paths = write_corpus(directory, scale)
+        size = os.path.getsize(paths['plan'][0])
+        print(f'{name}: план {size / 1024 / 1024:.1f} МБ, дисциплин {scale.subjects}')
+        results = {}
+        for bench in benchmarks:
+            result = BENCHMARKS[bench](paths, repeat)
+            results[bench] = result
+            print(f'  {bench}: {result["min"]:.3f} с (медиана {result["median"]:.3f} с)')
+    return {'params': scale._asdict(), 'plan_size': size, 'benchmarks': results}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """ Замеры, которые по минимальному времени стали медленнее прошлого прогона больше чем в threshold раз """
+    regressions = []
+    for scale, scale_results in results['scales'].items():
+        old_scale = baseline.get('scales', {}).get(scale)
+        if not old_scale or old_scale.get('params') != scale_results['params']:
+            continue
+        for bench, result in scale_results['benchmarks'].items():
+            old = old_scale['benchmarks'].get(bench)
+            if old and old['min'] > 0 and result['min'] / old['min'] > threshold:
+                regressions.append(f'{scale}/{bench}: {old["min"]:.3f} с -> {result["min"]:.3f} с '
+                                   f'(x{result["min"] / old["min"]:.2f})')
+    return regressions
+
+
+def main() -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'],
+                        help='Размеры синтетических данных')
+    parser.add_argument('-B', '--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help='Какие замеры выполнить')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Число повторов замера')
+    parser.add_argument('-o', '--output', type=str, default='benchmark_results.json', help='Файл результатов JSON')
+    parser.add_argument('-b', '--baseline', type=str, help='Результаты прошлого прогона для сравнения')
+    parser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Допустимое замедление относительно прошлого прогона, раз')
+    args = parser.parse_args()
+
+    results = {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': get_commit(),
+        'loader_version': LOADER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scales': {},
+    }
+    for name in args.scales:
+        results['scales'][name] = run_scale(name, SCALES[name], args.benchmarks, args.repeat)
+
+    with open(args.output, 'w', encoding='utf-8') as output_file:
+        json.dump(results, output_file, ensure_ascii=False, indent=2)
+    print(f'Результаты записаны в {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as input_file:
+            regressions = compare(results, json.load(input_file), args.threshold)
+        for regression in regressions:
+            print('  РЕГРЕССИЯ ' + regression)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Генератор синтетических входных данных для замеров: учебный план *.plx заданного
+размера, описания курсов *.yaml для его дисциплин и файлы РПД *.docx, которые
+читают get_fos.py и extractor2.py.
+
+Запуск: python benchmarks/synthetic.py <каталог> [--subjects 300] [--competences 40] ...
+В каталоге появятся plan.plx, courses/*.yaml и rpds/*.docx
+"""
+import argparse
+import os
+import random
+from typing import Dict, List, NamedTuple, TextIO, Tuple
+from xml.sax.saxutils import quoteattr
+
+import yaml
+from docx import Document
+
+PLAN_FILENAME = 'plan.plx'
+COURSES_DIR = 'courses'
+RPDS_DIR = 'rpds'
+
+# Слова для названий дисциплин: по ним курсы находят свою дисциплину и связи
+WORDS = (
+    'программирование сети базы данных системы анализ алгоритмы математика физика linux '
+    'операционные веб облачные технологии проектирование безопасность графика моделирование'
+).split()
+
+# Справочник видов работ: код -> аббревиатура (первые шесть - часы, остальные - контроль)
+WORK_TYPES = [
+    ('1', 'Лек'), ('2', 'Лаб'), ('3', 'Пр'), ('4', 'СР'), ('5', 'КСР'), ('6', 'Контроль'),
+    ('7', 'Эк'), ('8', 'За'), ('9', 'ЗаО'), ('10', 'КП'),
+]
+HOURS_WORKS = WORK_TYPES[:6]
+CONTROL_WORKS = WORK_TYPES[6:9]
+
+# Шкала оценивания для таблицы критериев в РПД
+MARKS = ('отлично', 'хорошо', 'удовлетворительно', 'неудовлетворительно')
+
+
+class Scale(NamedTuple):
+    """ Размер синтетического плана """
+    subjects: int = 60  # дисциплин
+    competences: int = 20  # компетенций
+    indicators: int = 3  # индикаторов у каждой компетенции
+    semesters: int = 8  # семестров обучения
+    links: int = 3  # связей с компетенциями у каждой дисциплины
+    courses: int = 3  # описаний курсов
+    rpds: int = 10  # файлов РПД
+
+
+class SyntheticSubject(NamedTuple):
+    """ Дисциплина синтетического плана """
+    key: int
+    code: str
+    name: str
+    competences: List[str]
+
+
+def get_subject_name(rnd: random.Random, number: int) -> str:
+    """ Название дисциплины: три случайных слова и номер, чтобы названия не повторялись """
+    return ' '.join(rnd.sample(WORDS, 3)).capitalize() + f' {number}'
+
+
+def write_plan(filename: str, scale: Scale, seed: int = 1) -> List[SyntheticSubject]:
+    """
+    Записать учебный план в формате *.plx. Каждая десятая строка дисциплин - группа
+    (ТипОбъекта=5), первые две дисциплины группы связаны с компетенциями через нее.
+    Возвращает дисциплины плана с шифрами их компетенций
+    """
+    rnd = random.Random(seed)
+    with open(filename, 'w', encoding='utf-8') as output:
+        output.write('<?xml version="1.0" standalone="yes"?>\n<Документ Тип="РУП">\n')
+        output.write('<diffgr:diffgram xmlns:msdata="urn:schemas-microsoft-com:xml-msdata" '
+                     'xmlns:diffgr="urn:schemas-microsoft-com:xml-diffgram-v1">\n')
+        output.write('<dsMMISDB xmlns="http://tempuri.org/dsMMISDB.xsd">\n')
+        output.write('<ООП Код="1" Шифр="09.03.01" Название="Информатика и вычислительная техника" '
+                     'Квалификация="2"><ООП Код="2" Шифр="09.03.01" Название="Программное обеспечение"/></ООП>\n')
+        competences, indicators = write_competences(output, scale)
+        subjects = write_subjects(output, rnd, scale, len(competences) + len(indicators) + 100)
+        write_hours(output, rnd, scale, subjects)
+        for code, abbr in WORK_TYPES:
+            output.write(f'<СправочникВидыРабот Код="{code}" Аббревиатура="{abbr}"/>\n')
+        result = write_links(output, rnd, scale, subjects, competences, indicators)
+        output.write('</dsMMISDB>\n</diffgr:diffgram>\n</Документ>\n')
+    return result
+
+
+def write_competences(output: TextIO, scale: Scale) -> Tuple[Dict[int, str], Dict[int, int]]:
+    """ Компетенции с вложенными индикаторами: (код -> шифр, код индикатора -> код компетенции) """
+    competences, indicators = {}, {}
+    key = 100
+    for i in range(scale.competences):
+        key += 1
+        comp_key = key
+        code = ('УК-', 'ОПК-', 'ПК-')[i % 3] + str(i // 3 + 1)
+        competences[comp_key] = code
+        output.write(f'<ПланыКомпетенции Код="{comp_key}" ШифрКомпетенции="{code}" '
+                     f'Наименование="Способен решать задачи {i + 1}">')
+        for j in range(scale.indicators):
+            key += 1
+            indicators[key] = comp_key
+            output.write(f'<ПланыКомпетенции Код="{key}" ШифрКомпетенции="{code}.{j + 1}" '
+                         f'Наименование="Индикатор {i + 1}.{j + 1}"/>')
+        output.write('</ПланыКомпетенции>\n')
+    return competences, indicators
+
+
+def write_subjects(output: TextIO, rnd: random.Random, scale: Scale, key: int) -> List[Tuple[int, int, str, str]]:
+    """ Строки дисциплин и групп: список (код, код группы, шифр, название) """
+    subjects = []
+    group = 0
+    for i in range(scale.subjects):
+        key += 1
+        if i % 10 == 0:
+            group = key
+            output.write(f'<ПланыСтроки Код="{key}" ДисциплинаКод="Б1.В.ДВ.{i // 10 + 1:02d}" '
+                         f'Дисциплина="Дисциплины по выбору {i // 10 + 1}" ТипОбъекта="5"/>\n')
+            key += 1
+        code = f'Б1.О.{i + 1:02d}'
+        name = get_subject_name(rnd, i + 1)
+        parent = group if i % 10 in (1, 2) else 0
+        output.write(f'<ПланыСтроки Код="{key}" ДисциплинаКод="{code}" Дисциплина={quoteattr(name)} '
+                     f'КодРодителя="{parent}" ТипОбъекта="2"/>\n')
+        subjects.append((key, parent, code, name))
+    return subjects
+
+
+def write_hours(output: TextIO, rnd: random.Random, scale: Scale, subjects: List[Tuple[int, int, str, str]]) -> None:
+    """ Часы дисциплин: от одного до трех семестров подряд, в каждом - часы и форма контроля """
+    number = 0
+    for key, _, _, _ in subjects:
+        first = rnd.randint(1, scale.semesters)
+        for semester in range(first, min(scale.semesters, first + rnd.randint(0, 2)) + 1):
+            course, half = (semester + 1) // 2, 2 - semester % 2
+            rows = [(work, hours_type, rnd.randint(0, 72)) for work, _ in HOURS_WORKS
+                    for hours_type in (('1', '5') if rnd.random() < 0.3 else ('1',))]
+            rows.append((rnd.choice(CONTROL_WORKS)[0], '1', 0))
+            for work, hours_type, hours in rows:
+                number += 1
+                output.write(f'<ПланыНовыеЧасы Код="{number}" КодОбъекта="{key}" Курс="{course}" '
+                             f'Семестр="{half}" Количество="{hours}" КодТипаЧасов="{hours_type}" '
+                             f'КодВидаРаботы="{work}"/>\n')
+
+
+def write_links(output: TextIO, rnd: random.Random, scale: Scale, subjects: List[Tuple[int, int, str, str]],
+                competences: Dict[int, str], indicators: Dict[int, int]) -> List[SyntheticSubject]:
+    """ Связи дисциплин с компетенциями или их индикаторами, а групп - с первой компетенцией """
+    result = []
+    number = 0
+    groups = set()
+    first_competence = next(iter(competences), None)
+    for key, parent, code, name in subjects:
+        linked = set()
+        for ind_key in rnd.sample(sorted(indicators), min(scale.links, len(indicators))):
+            comp_key = indicators[ind_key]
+            number += 1
+            output.write(f'<ПланыКомпетенцииДисциплины Код="{number}" КодСтроки="{key}" '
+                         f'КодКомпетенции="{rnd.choice((comp_key, ind_key))}"/>\n')
+            linked.add(competences[comp_key])
+        if parent:
+            groups.add(parent)
+            if first_competence is not None:
+                linked.add(competences[first_competence])
+        result.append(SyntheticSubject(key, code, name, sorted(linked)))
+    if first_competence is not None:
+        for group in sorted(groups):
+            number += 1
+            output.write(f'<ПланыКомпетенцииДисциплины Код="{number}" КодСтроки="{group}" '
+                         f'КодКомпетенции="{first_competence}"/>\n')
+    return result
+
+
+def write_course(filename: str, subject: SyntheticSubject, rnd: random.Random, themes: int = 8) -> None:
+    """ Описание курса для дисциплины плана: название из ее слов, связи - по случайным словам """
+    data = {
+        'названия': [subject.name.lower().split()],
+        'авторы': ['Иванов И.И., доцент кафедры ИТ, ii.ivanov@example.com'],
+        'год': 2024,
+        'цель': f'освоение дисциплины «{subject.name}».',
+        'содержание': ' '.join(f'Тема {i + 1}.' for i in range(themes)),
+        'знать': ['основные понятия дисциплины;', 'методы решения типовых задач.'],
+        'уметь': ['применять методы дисциплины на практике.'],
+        'владеть': ['инструментами дисциплины.'],
+        'связи': [[word] for word in rnd.sample(WORDS, 3)],
+        'темы': [
+            {'тема': f'{i + 1}. Тема {i + 1}.', 'содержание': 'Содержание темы. ' * 20}
+            for i in range(themes)
+        ],
+        'контроль': [
+            {'подзаголовок': f'Контрольные вопросы по теме {i + 1}', 'содержание': 'Вопрос?\n  a. Да\n  b. Нет'}
+            for i in range(themes)
+        ],
+        'интернет-сайты': ['Поисковая система Google https://www.google.com/'],
+        'программное обеспечение': ['Свободное ПО'],
+        'информационные системы': ['Электронно-библиотечная система'],
+        'основная литература': {'ссылки': [{'гост': 'Автор А.А. Учебник. — М., 2020. — 100 с.',
+                                            'гриф': '—', 'экз': '—', 'эбс': '—'}]},
+        'дополнительная литература': {'ссылки': []},
+    }
+    with open(filename, 'w', encoding='utf-8') as output:
+        yaml.dump(data, output, allow_unicode=True, sort_keys=False)
+
+
+def write_rpd(filename: str, subject: SyntheticSubject) -> None:
+    """
+    Файл РПД с теми частями, которые читают get_fos.get_rpd_dict и extractor2.find_rpd:
+    таблица результатов обучения по компетенциям, шкала оценивания и контрольные задания
+    """
+    document = Document()
+    document.add_heading(f'Рабочая программа дисциплины {subject.code} {subject.name}', level=1)
+
+    table = document.add_table(rows=1, cols=5)
+    header = ('№', 'Компетенция', 'Индикаторы (ЗУВ)', 'Планируемые результаты обучения по дисциплине',
+              'Оценочные средства')
+    for cell, text in zip(table.rows[0].cells, header):
+        cell.text = text
+    for number, code in enumerate(subject.competences, 1):
+        cells = table.add_row().cells
+        cells[0].text = str(number)
+        cells[1].text = f'{code}. Способен решать задачи'
+        cells[2].text = f'{code}.1. Индикатор'
+        cells[3].text = 'Знать:\nосновные понятия\nУметь:\nрешать задачи\nВладеть:\nнавыками работы'
+        cells[4].text = 'Тестовые вопросы'
+
+    table = document.add_table(rows=1, cols=3)
+    for cell, text in zip(table.rows[0].cells, ('Уровень', 'Критерии оценивания', 'Шкала оценивания')):
+        cell.text = text
+    for mark in MARKS:
+        cells = table.add_row().cells
+        cells[0].text = mark.capitalize()
+        cells[1].text = f'Критерии для оценки «{mark}»'
+        cells[2].text = mark
+
+    document.add_paragraph('Примерные контрольные задания (вопросы) для оценки знаний')
+    for number in range(1, 11):
+        document.add_paragraph(f'{number}. Вопрос к экзамену по дисциплине {subject.name}')
+    document.add_paragraph('Перечень основной учебной литературы')
+    document.save(filename)
+
+
+def write_corpus(directory: str, scale: Scale, seed: int = 1) -> Dict[str, List[str]]:
+    """
+    Записать план, описания курсов и РПД в каталог. Курсы и РПД пишутся для
+    дисциплин, равномерно взятых по всему плану. Возвращает пути: 'plan' - [план],
+    'courses' и 'rpds' - списки файлов
+    """
+    rnd = random.Random(seed)
+    os.makedirs(os.path.join(directory, COURSES_DIR), exist_ok=True)
+    os.makedirs(os.path.join(directory, RPDS_DIR), exist_ok=True)
+    plan_filename = os.path.join(directory, PLAN_FILENAME)
+    subjects = write_plan(plan_filename, scale, seed)
+
+    courses = []
+    for subject in spread(subjects, scale.courses):
+        filename = os.path.join(directory, COURSES_DIR, subject.code.replace('.', '_') + '.yaml')
+        write_course(filename, subject, rnd)
+        courses.append(filename)
+
+    rpds = []
+    for subject in spread(subjects, scale.rpds):
+        filename = os.path.join(directory, RPDS_DIR, f'{subject.code} {subject.name}.docx')
+        write_rpd(filename, subject)
+        rpds.append(filename)
+    return {'plan': [plan_filename], 'courses': courses, 'rpds': rpds}
+
+
+def spread(items: List[SyntheticSubject], count: int) -> List[SyntheticSubject]:
+    """ count элементов, равномерно взятых из списка """
+    count = min(count, len(items))
+    if count <= 0:
+        return []
+    step = len(items) / count
+    return [items[int(i * step)] for i in range(count)]
+
+
+def main() -> None:
+    """ Точка входа """
+    defaults = Scale()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory', type=str, help='Каталог для файлов')
+    for field in Scale._fields:
+        parser.add_argument(f'--{field}', type=int, default=getattr(defaults, field))
+    parser.add_argument('--seed', type=int, default=1, help='Зерно генератора случайных чисел')
+    args = parser.parse_args()
+
+    scale = Scale(**{field: getattr(args, field) for field in Scale._fields})
+    paths = write_corpus(args.directory, scale, args.seed)
+    size = os.path.getsize(paths['plan'][0]) / 1024 / 1024
+    print(f'План {paths["plan"][0]} ({size:.1f} МБ), курсов: {len(paths["courses"])}, РПД: {len(paths["rpds"])}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,3 @@
-from .course import Course
-from .education_plan import Competence, EducationPlan, Subject, get_plan
+from . import cache
+from .course import Course, load_course
+from .education_plan import Competence, EducationPlan, Subject, get_plan, load_plans
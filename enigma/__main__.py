@@ -0,0 +1,89 @@
+"""
+Служебные команды пакета: python -m enigma <команда>
+"""
+import argparse
+import json
+
+from . import cache
+from .education_plan import get_plan, load_plans
+from .plan_diff import diff_plans
+
+
+def clear_cache(args: argparse.Namespace) -> None:
+    """ Очистить кэш разобранных файлов """
+    print(f'Удалено файлов: {cache.clear(args.cache_dir)}')
+
+
+def show_cache(args: argparse.Namespace) -> None:
+    """ Показать каталог кэша """
+    print(cache.get_cache_dir(args.cache_dir))
+
+
+def load_plans_command(args: argparse.Namespace) -> None:
+    """ Прочитать каталог учебных планов в пуле процессов """
+    plans, errors = load_plans(args.directory, args.workers, args.memory_limit, not args.no_cache, args.cache_dir)
+    # Планы и ошибки - по имени файла без расширения: шифр ООП у планов разных лет набора совпадает
+    for stem in sorted(plans):
+        plan = plans[stem]
+        print(f'{stem}\t{plan.code} {plan.name}\tдисциплин: {len(plan.subject_keys)}')
+    for stem in sorted(errors):
+        print(f'{stem}\tОШИБКА: {errors[stem]}')
+    print(f'Прочитано планов: {len(plans)}, с ошибками: {len(errors)}')
+
+
+def diff_command(args: argparse.Namespace) -> None:
+    """ Сравнить две версии учебного плана """
+    use_cache = not args.no_cache
+    old_plan = get_plan(args.old, use_cache, args.cache_dir)
+    new_plan = get_plan(args.new, use_cache, args.cache_dir)
+    diff = diff_plans(old_plan, new_plan)
+    if args.json:
+        result = diff.to_dict()
+        result['affected_subjects'] = sorted(diff.affected_subjects(new_plan))
+        result['affected_competences'] = sorted(diff.affected_competences(new_plan))
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    if diff.header:
+        print('Изменились реквизиты ООП')
+    for code, changes in diff.to_dict()['subjects'].items():
+        print(f'{code}\t{", ".join(changes)}')
+    for code, changes in diff.to_dict()['competences'].items():
+        print(f'{code}\t{", ".join(changes)}')
+    print('Пересоздать РПД: ' + ', '.join(sorted(diff.affected_subjects(new_plan))))
+    print('Пересоздать строки ФОС для компетенций: ' + ', '.join(sorted(diff.affected_competences(new_plan))))
+
+
+def main() -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(prog='python -m enigma')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('clear-cache', help='Очистить кэш разобранных файлов')
+    command.add_argument('--cache-dir', type=str, help='Каталог кэша')
+    command.set_defaults(handler=clear_cache)
+
+    command = commands.add_parser('cache-dir', help='Показать каталог кэша')
+    command.add_argument('--cache-dir', type=str, help='Каталог кэша')
+    command.set_defaults(handler=show_cache)
+
+    command = commands.add_parser('load-plans', help='Прочитать каталог учебных планов *.plx')
+    command.add_argument('directory', help='Каталог с файлами *.plx')
+    command.add_argument('-j', '--workers', type=int, help='Число процессов (по умолчанию - число ядер)')
+    command.add_argument('-m', '--memory-limit', type=int, help='Лимит памяти на процесс, МБ')
+    cache.add_arguments(command)
+    command.set_defaults(handler=load_plans_command)
+
+    command = commands.add_parser('diff', help='Сравнить две версии учебного плана')
+    command.add_argument('old', help='Старый файл *.plx')
+    command.add_argument('new', help='Новый файл *.plx')
+    command.add_argument('--json', action='store_true', help='Вывести результат в формате JSON')
+    cache.add_arguments(command)
+    command.set_defaults(handler=diff_command)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
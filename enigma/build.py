@@ -0,0 +1,102 @@
+"""
+Инкрементальная сборка выходных документов.
+
+Для каждого созданного файла в манифесте запоминаются SHA-256 его входов
+(учебный план, курс, шаблон, сканы, версия генератора) и самого результата.
+При следующем запуске документ пересоздается, только если поменялся
+какой-то вход или выходной файл был изменен или удален.
+
+Манифест лежит в каталоге с выходными файлами (MANIFEST_NAME), а пути
+в нем записаны относительно этого каталога, поэтому локальные запуски и CI
+могут пользоваться одним манифестом.
+"""
+import json
+import os
+from typing import Dict, Tuple
+
+from .cache import file_hash
+
+MANIFEST_NAME = '.enigma-build.json'
+MANIFEST_VERSION = 1  # увеличивать при изменении формата манифеста
+
+OUTPUT_KEY = 'output'  # ключ записи с хэшем самого выходного файла
+
+# Хэши файлов: полный путь -> ((время изменения, размер), SHA-256).
+# Один и тот же план и шаблон входят во все документы пакета, читать их каждый раз незачем
+_hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def hash_file(filename: str) -> str:
+    """ SHA-256 содержимого файла; пересчитывается, только если файл изменился """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    stamp = stat.st_mtime_ns, stat.st_size
+    cached = _hashes.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = stamp, file_hash(path)
+        _hashes[path] = cached
+    return cached[1]
+
+
+class Manifest:
+    """
+    Манифесты сборки всех каталогов, в которые пишутся выходные файлы:
+    каталог -> имя выходного файла -> вход -> хэш. С force=True все файлы
+    считаются устаревшими, но входы пересобранных файлов записываются как обычно
+    """
+    def __init__(self, force: bool = False):
+        self.force = force
+        self.entries: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self.changed = set()
+
+    def directory(self, output_file: str) -> Dict[str, Dict[str, str]]:
+        """ Записи манифеста каталога выходного файла, при первом обращении читаются с диска """
+        path = os.path.dirname(os.path.abspath(output_file))
+        if path not in self.entries:
+            try:
+                with open(os.path.join(path, MANIFEST_NAME), encoding='utf-8') as input_file:
+                    data = json.load(input_file)
+                outputs = data['outputs'] if data.get('version') == MANIFEST_VERSION else {}
+            except (OSError, ValueError, KeyError, AttributeError):
+                outputs = {}
+            self.entries[path] = outputs
+        return self.entries[path]
+
+    def get(self, output_file: str) -> Dict[str, str]:
+        """ Записанные входы выходного файла, пустой словарь - если его еще не собирали """
+        return self.directory(output_file).get(os.path.basename(output_file), {})
+
+    def is_fresh(self, output_file: str, inputs: Dict[str, str]) -> bool:
+        """ Выходной файл существует, не изменялся после сборки и собран из тех же входов """
+        if self.force:
+            return False
+        record = dict(self.get(output_file))
+        output_hash = record.pop(OUTPUT_KEY, None)
+        if record != inputs or not os.path.exists(output_file):
+            return False
+        return hash_file(output_file) == output_hash
+
+    def record(self, output_file: str, inputs: Dict[str, str]) -> None:
+        """ Запомнить входы только что собранного файла """
+        self.set(output_file, dict(inputs, **{OUTPUT_KEY: hash_file(output_file)}))
+
+    def set(self, output_file: str, record: Dict[str, str]) -> None:
+        """ Записать готовую запись манифеста, например полученную от процесса пула """
+        self.directory(output_file)[os.path.basename(output_file)] = record
+        self.changed.add(os.path.dirname(os.path.abspath(output_file)))
+
+    def save(self) -> None:
+        """ Атомарно записать измененные манифесты """
+        for path in sorted(self.changed):
+            filename = os.path.join(path, MANIFEST_NAME)
+            tmp_filename = f'{filename}.{os.getpid()}.tmp'
+            data = {'version': MANIFEST_VERSION, 'outputs': self.entries[path]}
+            try:
+                with open(tmp_filename, 'w', encoding='utf-8') as output_file:
+                    json.dump(data, output_file, ensure_ascii=False, indent=2, sort_keys=True)
+                os.replace(tmp_filename, filename)
+            except OSError as error:
+                print(f'Не могу записать манифест сборки {filename}: {error}')
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+        self.changed.clear()
@@ -0,0 +1,118 @@
+"""
+Кэш разобранных входных файлов на диске.
+
+Снимок хранится в виде pickle и ищется по SHA-256 содержимого исходного файла,
+поэтому переименование файла кэш не сбрасывает, а любое изменение содержимого
+приводит к новому ключу. Вместе со снимком записывается версия загрузчика:
+если формат объектов поменялся, снимок считается устаревшим и пересобирается.
+
+Очистка кэша из командной строки: python -m enigma clear-cache
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import re
+from typing import Any, BinaryIO, Callable
+
+ENV_CACHE_DIR = 'ENIGMA_CACHE_DIR'  # каталог кэша
+ENV_NO_CACHE = 'ENIGMA_NO_CACHE'  # отключить кэш, если задана непустая строка
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'glowing-enigma')
+SNAPSHOT_EXT = '.pickle'
+# Что принадлежит кэшу в его каталоге: подкаталоги со снимками load() (РУПы и курсы) и сканами enigma.scans,
+# где имя файла - SHA-256 и расширение, и индекс РПД enigma.rpd_index с журналом SQLite. Каталог кэша может
+# быть общим с другими файлами, поэтому clear удаляет только их
+CACHE_KINDS = {'plans': (SNAPSHOT_EXT,), 'courses': (SNAPSHOT_EXT,), 'scans': ('.jpg', '.orig')}
+CACHE_FILES = ('rpds.sqlite', 'rpds.sqlite-journal')
+# Имя файла в подкаталоге кэша: SHA-256, расширение и, у недописанного файла, суффикс write_file
+CACHE_NAME = re.compile(r'[0-9a-f]{64}(\.\w+)(\.\d+\.tmp)?')
+
+
+def get_cache_dir(cache_dir: str = None) -> str:
+    """ Каталог кэша: явно заданный, из окружения или по умолчанию """
+    return cache_dir or os.environ.get(ENV_CACHE_DIR) or DEFAULT_CACHE_DIR
+
+
+def is_enabled() -> bool:
+    """ Включен ли кэш по умолчанию """
+    return not os.environ.get(ENV_NO_CACHE)
+
+
+def file_hash(filename: str) -> str:
+    """ SHA-256 содержимого файла """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load(filename: str, kind: str, version: int, loader: Callable[[str], Any], cache_dir: str = None) -> Any:
+    """
+    Прочитать объект из кэша, а если снимка нет или он устарел, то
+    построить его функцией loader(filename) и сохранить в кэш
+    """
+    digest = file_hash(filename)
+    path = os.path.join(get_cache_dir(cache_dir), kind, digest + SNAPSHOT_EXT)
+
+    try:
+        with open(path, 'rb') as snapshot:
+            snap_version, snap_digest, obj = pickle.load(snapshot)
+        if snap_version == version and snap_digest == digest:
+            return obj
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, pickle.UnpicklingError):
+        pass
+
+    obj = loader(filename)
+    save(path, (version, digest, obj))
+    return obj
+
+
+def save(path: str, data: Any) -> None:
+    """ Записать снимок """
+    write_file(path, lambda snapshot: pickle.dump(data, snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def write_file(path: str, writer: Callable[[BinaryIO], Any]) -> bool:
+    """
+    Атомарно записать файл кэша функцией writer(файл), чтобы параллельные
+    запуски не видели недописанный файл. Возвращает False, если записать не удалось
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as output_file:
+            writer(output_file)
+        os.replace(tmp_path, path)
+    except OSError as error:
+        print(f'Не могу записать кэш {path}: {error}')
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+def clear(cache_dir: str = None) -> int:
+    """ Удалить файлы кэша (CACHE_KINDS и CACHE_FILES), возвращает количество удаленных файлов """
+    root = get_cache_dir(cache_dir)
+    paths = [path for path in (os.path.join(root, name) for name in CACHE_FILES) if os.path.isfile(path)]
+    for kind, exts in CACHE_KINDS.items():
+        directory = os.path.join(root, kind)
+        try:
+            filenames = os.listdir(directory)
+        except OSError:
+            continue
+        for filename in filenames:
+            match = CACHE_NAME.fullmatch(filename)
+            if match is not None and match.group(1) in exts:
+                paths.append(os.path.join(directory, filename))
+    for path in paths:
+        os.remove(path)
+    return len(paths)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """ Добавить в парсер аргументов ключи управления кэшем """
+    parser.add_argument('--no-cache', action='store_true', help='Не использовать кэш разобранных файлов')
+    parser.add_argument('--cache-dir', type=str, help=f'Каталог кэша (по умолчанию {DEFAULT_CACHE_DIR})')
@@ -1,22 +1,42 @@
 """
 Класс для данных курса обучения в виде файлов *.yaml
+
+Разобранный и проверенный курс сохраняется в кэш (см. enigma.cache) под хэшем
+содержимого файла, поэтому повторное чтение каталога курсов почти ничего не стоит.
+Форматированный текст (RichText) для тем и контрольных вопросов строится только
+при первом обращении к themes и controls, то есть при генерации документа:
+для поиска дисциплины в плане достаточно названий и связей.
 """
 
+import functools
 import unicodedata
 from typing import Dict, List, Set, Union, Any
 
 import yaml
 from docxtpl import R, RichText
 
+from . import cache
+
+COURSE_VERSION = 1  # увеличивать при изменении формата объектов Course
+
+# Поля, которые читаются без значения по умолчанию. Цели нет: шаблон РПД выводит ее, только если она задана
+REQUIRED_KEYS = ('названия', 'авторы', 'год', 'содержание', 'знать', 'уметь', 'владеть', 'связи', 'темы')
+
 
 class Course:
     """ Курс обучения """
     def __init__(self, filename: str):
         with open(filename, encoding='UTF-8') as input_file:
             try:
-                data = yaml.load(input_file, Loader=yaml.CLoader)
-            except AttributeError:
-                data = yaml.load(input_file, Loader=yaml.Loader)
+                data = yaml.load(input_file, Loader=getattr(yaml, 'CLoader', yaml.Loader))
+            except yaml.YAMLError as error:
+                raise ValueError(f'Ошибка разбора курса {filename}: {error}') from error
+        if not isinstance(data, dict):
+            raise ValueError(f'Курс {filename} должен быть словарем YAML')
+        missing = [key for key in REQUIRED_KEYS if key not in data]
+        if missing:
+            raise ValueError(f'В курсе {filename} нет полей: ' + ', '.join(missing))
+
         for name in data['названия']:
             for i, word in enumerate(name):
                 name[i] = unicodedata.normalize('NFC', word)
@@ -34,14 +54,9 @@ class Course:
         self.links: List[Set[str]] = [set(name) for name in data['связи']]
         self.assessment: List[str] = data.get('оценочные средства', 'Лабораторные работы, тестовые вопросы')
 
-        self.themes: List[Dict[str, Union[str, RichText]]] = data['темы']
-        for item in self.themes:
-            item['содержание'] = R(item['содержание'].replace('\n', '\a'), style='Абзац списка')
-
-        self.controls: List[Dict[str, Union[str, List[str], RichText]]] = data.get('контроль', [])
-        for item in self.controls:
-            item['подзаголовок'] = R(item['подзаголовок'].replace('\n', '\a'), style='Подзаголовок')
-            item['содержание'] = R(item['содержание'].replace('\n', '\a'), style='Абзац списка')
+        # Темы и контроль в виде текста, RichText строятся в themes и controls
+        self.theme_items: List[Dict[str, str]] = data['темы']
+        self.control_items: List[Dict[str, Union[str, List[str]]]] = data.get('контроль', [])
 
         self.websites = data.get('интернет-сайты', ['Поисковая система Google https://www.google.com/'])
         self.software: List[str] = data.get('программное обеспечение', [])
@@ -52,3 +67,43 @@ class Course:
 
         secondary_books: Dict[str, Any] = data.get('дополнительная литература', {})
         self.secondary_books: List[Dict[str, Any]] = secondary_books.get('ссылки', [])
+
+    @functools.cached_property
+    def themes(self) -> List[Dict[str, Union[str, RichText]]]:
+        """ Темы с содержанием в виде RichText """
+        return [
+            {**item, 'содержание': R(item['содержание'].replace('\n', '\a'), style='Абзац списка')}
+            for item in self.theme_items
+        ]
+
+    @functools.cached_property
+    def controls(self) -> List[Dict[str, Union[str, List[str], RichText]]]:
+        """ Контрольные вопросы с подзаголовком и содержанием в виде RichText """
+        return [
+            {
+                **item,
+                'подзаголовок': R(item['подзаголовок'].replace('\n', '\a'), style='Подзаголовок'),
+                'содержание': R(item['содержание'].replace('\n', '\a'), style='Абзац списка'),
+            }
+            for item in self.control_items
+        ]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """ В снимок попадают только данные файла, без построенных RichText """
+        state = dict(self.__dict__)
+        state.pop('themes', None)
+        state.pop('controls', None)
+        return state
+
+
+def load_course(course_filename: str, use_cache: bool = None, cache_dir: str = None) -> Course:
+    """
+    Читаем курс обучения. Если кэш не отключен (параметром или переменной
+    окружения ENIGMA_NO_CACHE), то разобранный курс берется из снимка на диске.
+    Ошибки в содержимом файла - ValueError, недоступный файл - OSError
+    """
+    if use_cache is None:
+        use_cache = cache.is_enabled()
+    if use_cache:
+        return cache.load(course_filename, 'courses', COURSE_VERSION, Course, cache_dir)
+    return Course(course_filename)
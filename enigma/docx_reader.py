@@ -0,0 +1,154 @@
+"""
+Чтение текста docx без python-docx.
+
+Для извлечения данных из готовых РПД объектная модель python-docx не нужна:
+достаточно текста абзацев и таблиц. Здесь основная часть документа
+(word/document.xml) читается из zip-архива потоково через iterparse: абзацы
+и таблицы верхнего уровня выдаются по одному, а разобранные элементы сразу
+удаляются из дерева, поэтому память не растет с размером документа, а чтение
+можно прекратить, как только нужный раздел прочитан.
+
+Текст совпадает с тем, что дает python-docx: абзац - это текст прямых
+потомков w:r и w:hyperlink, ячейка таблицы - ее абзацы через перевод строки,
+объединенные по горизонтали (gridSpan) и по вертикали (vMerge) ячейки
+повторяются во всех клетках сетки, которые занимают.
+"""
+import posixpath
+import zipfile
+from typing import Dict, Iterator, List, NamedTuple, Tuple, Union
+from xml.etree.ElementTree import Element, fromstring, iterparse
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+RELS_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+DOCUMENT_PART = 'word/document.xml'
+
+# Текст элементов внутри w:r, кроме w:t и w:br (см. CT_R.text в python-docx)
+RUN_TEXT = {W + 'tab': '\t', W + 'ptab': '\t', W + 'cr': '\n', W + 'noBreakHyphen': '-'}
+
+
+class Table(NamedTuple):
+    """ Таблица: текст ячеек по строкам и число столбцов сетки таблицы """
+    rows: List[List[str]]
+    columns: int
+
+
+Item = Union[str, Table]  # абзац или таблица
+
+
+def get_run_text(run: Element) -> str:
+    """ Текст w:r """
+    result = []
+    for child in run:
+        if child.tag == W + 't':
+            result.append(child.text or '')
+        elif child.tag == W + 'br':
+            # Разрывы страницы и колонки в тексте не видны
+            result.append('\n' if child.get(W + 'type', 'textWrapping') == 'textWrapping' else '')
+        else:
+            result.append(RUN_TEXT.get(child.tag, ''))
+    return ''.join(result)
+
+
+def get_paragraph_text(paragraph: Element) -> str:
+    """ Текст w:p """
+    result = []
+    for child in paragraph:
+        if child.tag == W + 'r':
+            result.append(get_run_text(child))
+        elif child.tag == W + 'hyperlink':
+            result += [get_run_text(run) for run in child.iterfind(W + 'r')]
+    return ''.join(result)
+
+
+def get_int(element: Element, path: str, default: int) -> int:
+    """ Целое значение w:val дочернего элемента path """
+    child = element.find(path)
+    return int(child.get(W + 'val')) if child is not None else default
+
+
+def read_row(row: Element, above: Dict[int, str]) -> Tuple[List[str], Dict[int, str]]:
+    """
+    Текст ячеек w:tr. above - текст ячеек предыдущей строки по их началу в сетке
+    таблицы, для продолжений вертикально объединенных ячеек. Возвращает текст
+    ячеек строки и такой же словарь для следующей строки
+    """
+    cells: List[str] = []
+    starts: Dict[int, str] = {}
+    offset = get_int(row, f'{W}trPr/{W}gridBefore', 0)
+    for cell in row.iterfind(W + 'tc'):
+        span = get_int(cell, f'{W}tcPr/{W}gridSpan', 1)
+        merge = cell.find(f'{W}tcPr/{W}vMerge')
+        if merge is not None and merge.get(W + 'val', 'continue') == 'continue' and offset in above:
+            text = above[offset]
+        else:
+            text = '\n'.join(get_paragraph_text(paragraph) for paragraph in cell.iterfind(W + 'p'))
+        starts[offset] = text
+        cells += [text] * span
+        offset += span
+    return cells, starts
+
+
+def get_document_part(archive: zipfile.ZipFile) -> str:
+    """ Имя основной части документа в архиве по связям пакета """
+    try:
+        relationships = fromstring(archive.read('_rels/.rels'))
+    except KeyError:
+        return DOCUMENT_PART
+    for relationship in relationships.iterfind(RELS_NS + 'Relationship'):
+        if relationship.get('Type') == OFFICE_DOCUMENT:
+            return posixpath.normpath(relationship.get('Target').lstrip('/'))
+    return DOCUMENT_PART
+
+
+def iter_items(filename: str) -> Iterator[Item]:
+    """
+    Абзацы (строки) и таблицы основного текста документа по порядку. Строки
+    таблиц разбираются по мере чтения, поэтому в памяти не держится даже
+    дерево большой таблицы
+    """
+    with zipfile.ZipFile(filename) as archive, archive.open(get_document_part(archive)) as source:
+        depth, body, table = 0, None, None
+        rows: List[List[str]] = []
+        above: Dict[int, str] = {}
+        for event, element in iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 2 and element.tag == W + 'body':
+                    body = element
+                elif depth == 3 and body is not None and element.tag == W + 'tbl':
+                    table, rows, above = element, [], {}
+                continue
+            depth -= 1
+            if depth == 3 and table is not None and element.tag == W + 'tr':
+                cells, above = read_row(element, above)
+                rows.append(cells)
+                table.remove(element)  # прочитанные элементы больше не нужны
+            elif depth == 2 and body is not None:
+                if element.tag == W + 'p':
+                    yield get_paragraph_text(element)
+                elif element.tag == W + 'tbl':
+                    yield Table(rows, len(element.findall(f'{W}tblGrid/{W}gridCol')))
+                    table = None
+                body.clear()
+
+
+def iter_paragraphs(filename: str) -> Iterator[str]:
+    """ Абзацы основного текста документа без таблиц """
+    return (item for item in iter_items(filename) if isinstance(item, str))
+
+
+def get_section(filename: str, start_kw: List[str], final_kw: List[str]) -> List[str]:
+    """
+    Абзацы после первого абзаца с одним из слов start_kw и до абзаца с одним из
+    слов final_kw; дальше этого абзаца документ не читается
+    """
+    result, started = [], False
+    for text in iter_paragraphs(filename):
+        if not started:
+            started = any(kw in text for kw in start_kw)
+        elif any(kw in text for kw in final_kw):
+            break
+        else:
+            result.append(text)
+    return result
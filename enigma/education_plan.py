@@ -1,13 +1,29 @@
 """
 Классы для чтения рабочих учебных планов из файлов *.plx
 """
+import os
 import sys
-from typing import Dict, List, Set, Tuple
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, Mapping, Set, Tuple, Union
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element
 
+import numpy as np
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+from . import cache
 from .course import Course
 
+# Версия загрузчика: увеличивать при изменении состава или формата полей
+# EducationPlan и связанных классов, чтобы старые снимки в кэше пересобрались
+LOADER_VERSION = 4
+
 HOURS_PER_CREDIT = 36
 
 # Типы работ
@@ -30,30 +46,102 @@ WORK_TYPES = {
     'Контроль': 'exams',
 }
 
+# Индексы в массиве часов: вид работы и тип часов (обычные / с практической подготовкой)
+WORK_INDEX = {attr: index for index, attr in enumerate(WORK_TYPES.values())}
+HOURS_KINDS = 2
+KIND_REGULAR = 0
+KIND_PRACTICAL = 1
+HOURS_DTYPE = np.int32
+
+# Разделы плана, загружаемые по требованию, и их зависимости
+SECTION_HEADER = 'header'
+SECTION_COMPETENCES = 'competences'
+SECTION_SUBJECTS = 'subjects'
+SECTION_HOURS = 'hours'
+SECTION_LINKS = 'links'
+SECTIONS = (SECTION_HEADER, SECTION_COMPETENCES, SECTION_SUBJECTS, SECTION_HOURS, SECTION_LINKS)
+SECTION_DEPENDENCIES = {
+    SECTION_HOURS: (SECTION_SUBJECTS,),
+    SECTION_LINKS: (SECTION_COMPETENCES, SECTION_SUBJECTS),
+}
+
+# Путь к таблицам плана от корня документа
+PLAN_PATH = ('diffgram', 'dsMMISDB')
+
+# Таблицы плана, которые мы читаем
+PLAN_TABLES = (
+    'ООП', 'ПланыКомпетенции', 'ПланыСтроки', 'СправочникВидыРабот',
+    'ПланыНовыеЧасы', 'ПланыКомпетенцииДисциплины',
+)
+
+# Таблицы, строки которых бывают вложены друг в друга (профиль ООП, индикаторы компетенций)
+NESTED_TABLES = ('ООП', 'ПланыКомпетенции')
+
+# Разборщики XML. По замерам benchmarks/parse_backends.py на CPython 3.11 стандартный
+# ElementTree (с ускорителем на C) быстрее lxml: планы состоят из строк с множеством
+# атрибутов, а lxml тратит больше времени на их перекодировку в строки Python.
+# Поэтому lxml включается явно: параметром backend или переменной окружения
+ENV_XML_BACKEND = 'ENIGMA_XML_BACKEND'
+BACKEND_LXML = 'lxml'
+BACKEND_ETREE = 'etree'
+DEFAULT_BACKEND = BACKEND_ETREE
+
+
+def get_tokens(words: Iterable[str]) -> Set[str]:
+    """ Нормализованные слова для поиска дисциплин по названию """
+    return {unicodedata.normalize('NFC', word).lower() for word in words}
+
 
 class Base:
     """ Базовый класс данных """
+
+    # Атрибуты, которые заполняет учебный план при загрузке своего раздела: имя -> раздел
+    lazy_attrs: Dict[str, str] = {}
+
     def __init__(self, _: Element = None, key: str = '', code: str = ''):
         self.key = key
         self.code = code
+        self.plan: 'EducationPlan' = None  # план, который догрузит ленивые атрибуты
+
+    def __getattr__(self, attr: str):
+        # Вызывается только для отсутствующих атрибутов: загружаем нужный раздел плана
+        section = type(self).lazy_attrs.get(attr)
+        plan = self.__dict__.get('plan')
+        if section is None or plan is None:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {attr!r}')
+        plan.load(section)
+        return object.__getattribute__(self, attr)
+
+    def __getstate__(self):
+        # В снимок объект попадает только вместе с полностью загруженным планом
+        if self.__dict__.get('plan') is not None:
+            self.plan.load()
+        return self.__dict__
 
     @classmethod
     def get_dicts(cls, elem_name: str, elem: Element) -> 'Tuple[Dict[str, Base], Dict[str, Base]]':
         """ Получить словари с доступом по коду и шифру """
         dict1, dict2 = {}, {}
 
-        path = f'./{{*}}{elem_name}'
-        for sub_elem in elem.findall(path):
+        # Дочерние строки лежат в том же пространстве имен, что и родитель:
+        # путь с полным именем тега не требует перебора по маске {*}
+        for sub_elem in elem.findall(get_namespace(elem) + elem_name):
+            cls.add_to_dicts(sub_elem, dict1, dict2)
 
-            # Пропустим группу дисциплин
-            if sub_elem.get('ТипОбъекта') == '5':
-                continue
+        return dict1, dict2
 
-            obj = cls(sub_elem)
-            dict1[obj.key] = obj
-            dict2[obj.code] = obj
+    @classmethod
+    def add_to_dicts(cls, elem: Element, dict1: 'Dict[str, Base]', dict2: 'Dict[str, Base]') -> 'Base':
+        """ Создать объект и добавить его в словари с доступом по коду и шифру """
 
-        return dict1, dict2
+        # Пропустим группу дисциплин
+        if elem.get('ТипОбъекта') == '5':
+            return None
+
+        obj = cls(elem)
+        dict1[obj.key] = obj
+        dict2[obj.code] = obj
+        return obj
 
 
 class Indicator(Base):
@@ -68,11 +156,13 @@ class Competence(Indicator):
     """ Компетенция """
     indicator_keys: Dict[str, Indicator]
     indicator_codes: Dict[str, Indicator]
+    subjects: Set[str]  # шифры дисциплин, заполняются с разделом связей плана
+
+    lazy_attrs = {'subjects': SECTION_LINKS}
 
     def __init__(self, elem: Element):
         super().__init__(elem)
         self.indicator_keys, self.indicator_codes = Indicator.get_dicts('ПланыКомпетенции', elem)
-        self.subjects: Set[str] = set()
 
     @property
     def category(self) -> str:
@@ -108,35 +198,84 @@ class Competence(Indicator):
         return result
 
 
-class SemesterWork:
-    """ Трудоемкость """
-    def __init__(self):
-        self.lectures = 0  # лекции
-        self.labworks = 0  # лабораторные работы
-        self.practices = 0  # практические занятия
-        self.homeworks = 0  # самостоятельная работа студентов (СРС)
-        self.controls = 0  # контроль самостоятельной работы (КСР)
-        self.exams = 0  # часы на экзамен
-
-        # Пока прифигачим костыли
-        self.lectures_pp = 0  # лекции с ПП
-        self.labworks_pp = 0  # лабораторные работы с ПП
-        self.practices_pp = 0  # практические занятия с ПП
-        self.homeworks_pp = 0  # самостоятельная работа студентов (СРС) с ПП
-        self.controls_pp = 0  # контроль самостоятельной работы (КСР) с ПП
-        self.exams_pp = 0  # часы на экзамен с ПП
+class HoursField:
+    """ Поле часов SemesterWork, хранящееся в общем массиве часов учебного плана """
+    def __init__(self, attr: str, kind: int = KIND_REGULAR):
+        self.index = WORK_INDEX[attr]
+        self.kind = kind
+
+    def __get__(self, obj: 'SemesterWork', objtype=None):
+        if obj is None:
+            return self
+        return int(obj.hours[self.index, self.kind])
+
+    def __set__(self, obj: 'SemesterWork', value: int) -> None:
+        obj.hours[self.index, self.kind] = value
+
 
+def get_hours_table(subjects: int = 1, semesters: int = 0) -> np.ndarray:
+    """ Пустой массив часов: дисциплина x семестр x вид работы x тип часов """
+    return np.zeros((subjects, semesters, len(WORK_INDEX), HOURS_KINDS), dtype=HOURS_DTYPE)
+
+
+class SemesterWork:
+    """ Трудоемкость: срез массива часов по дисциплине и семестру """
+    lectures = HoursField('lectures')  # лекции
+    labworks = HoursField('labworks')  # лабораторные работы
+    practices = HoursField('practices')  # практические занятия
+    homeworks = HoursField('homeworks')  # самостоятельная работа студентов (СРС)
+    controls = HoursField('controls')  # контроль самостоятельной работы (КСР)
+    exams = HoursField('exams')  # часы на экзамен
+
+    # Пока прифигачим костыли
+    lectures_pp = HoursField('lectures', KIND_PRACTICAL)  # лекции с ПП
+    labworks_pp = HoursField('labworks', KIND_PRACTICAL)  # лабораторные работы с ПП
+    practices_pp = HoursField('practices', KIND_PRACTICAL)  # практические занятия с ПП
+    homeworks_pp = HoursField('homeworks', KIND_PRACTICAL)  # самостоятельная работа студентов (СРС) с ПП
+    controls_pp = HoursField('controls', KIND_PRACTICAL)  # контроль самостоятельной работы (КСР) с ПП
+    exams_pp = HoursField('exams', KIND_PRACTICAL)  # часы на экзамен с ПП
+
+    def __init__(self, table: np.ndarray = None, subject: int = 0, semester: int = 0):
+        # Храним ссылку на весь массив, а не срез: так при сохранении плана в кэш
+        # массив пишется один раз и после загрузки остается общим
+        self.table = get_hours_table(1, 1) if table is None else table
+        self.subject = subject
+        self.semester = semester
         self.control: Set[str] = set()  # формы контроля
 
+    @property
+    def hours(self) -> np.ndarray:
+        """ Часы за семестр: вид работы x тип часов """
+        return self.table[self.subject, self.semester]
+
 
 class Subject(Base):
     """ Дисциплина """
+    # Заполняются с разделом часов плана
+    semesters: Dict[int, SemesterWork]
+    table: np.ndarray
+    first_semester: int
+    last_semester: int
+    # Заполняется с разделом связей плана
+    competencies: Set[str]
+
+    lazy_attrs = {
+        'semesters': SECTION_HOURS, 'table': SECTION_HOURS,
+        'first_semester': SECTION_HOURS, 'last_semester': SECTION_HOURS,
+        'competencies': SECTION_LINKS,
+    }
+
     def __init__(self, elem: Element):
         super().__init__(key=elem.get('Код'), code=elem.get('ДисциплинаКод'))
         self.name: str = elem.get('Дисциплина')
         self.parent: str = elem.get('КодРодителя')
-        self.semesters: Dict[int, SemesterWork] = dict()
-        self.competencies: Set[str] = set()
+        self.tokens: Set[str] = get_tokens(self.name.split())
+        self.index = 0
+
+    @property
+    def hours(self) -> np.ndarray:
+        """ Часы дисциплины: семестр x вид работы x тип часов """
+        return self.table[self.index]
 
     def get_controls(self) -> str:
         """ Формы контроля для печати """
@@ -160,7 +299,10 @@ class Subject(Base):
 
     def get_hours(self, attr: str) -> int:
         """ Сумма часов определенного типа """
-        return sum([semester.__getattribute__(attr) for semester in self.semesters.values()])
+        kind = KIND_REGULAR
+        if attr.endswith('_pp'):
+            attr, kind = attr[:-3], KIND_PRACTICAL
+        return int(self.hours[:, WORK_INDEX[attr], kind].sum())
 
     def get_hours_str(self, attr: str) -> str:
         """ Сумма часов определенного типа для печати """
@@ -169,18 +311,14 @@ class Subject(Base):
 
     def get_hours_123(self) -> str:
         """ Сумма часов аудиторной работы """
-        hours1 = sum([semester.lectures for semester in self.semesters.values()])
-        hours21 = sum([semester.practices for semester in self.semesters.values()])
-        hours22 = sum([semester.labworks for semester in self.semesters.values()])
-        hours3 = sum([semester.controls for semester in self.semesters.values()])
-        hours = hours1 + hours21 + hours22 + hours3
+        works = [WORK_INDEX['lectures'], WORK_INDEX['practices'], WORK_INDEX['labworks'], WORK_INDEX['controls']]
+        hours = int(self.hours[:, works, KIND_REGULAR].sum())
         return '—' if hours == 0 else str(hours)
 
     def get_hours_2(self) -> str:
         """ Сумма часов семинарского типа (практика + лабораторки) """
-        hours21 = sum([semester.practices for semester in self.semesters.values()])
-        hours22 = sum([semester.labworks for semester in self.semesters.values()])
-        hours = hours21 + hours22
+        works = [WORK_INDEX['practices'], WORK_INDEX['labworks']]
+        hours = int(self.hours[:, works, KIND_REGULAR].sum())
         return '—' if hours == 0 else str(hours)
 
     def get_semesters(self) -> str:
@@ -194,19 +332,11 @@ class Subject(Base):
 
     def get_total_hours(self) -> int:
         """ Общее количество часов """
-        result = 0
-        for semester in self.semesters.values():
-            result += semester.lectures + semester.practices + semester.labworks
-            result += semester.homeworks + semester.controls + semester.exams
-        return result
+        return int(self.hours[:, :, KIND_REGULAR].sum())
 
     def get_practical_hours(self):
         """ Количество часов практической переподготовки """
-        result = 0
-        for semester in self.semesters.values():
-            result += semester.lectures_pp + semester.practices_pp + semester.labworks_pp
-            result += semester.homeworks_pp + semester.controls_pp + semester.exams_pp
-        return result
+        return int(self.hours[:, :, KIND_PRACTICAL].sum())
 
     @staticmethod
     def repr(subject: 'Subject'):
@@ -215,37 +345,157 @@ class Subject(Base):
 
 
 class EducationPlan:
-    """ Рабочий учебный план """
+    """
+    Рабочий учебный план. Разделы (шапка, компетенции, дисциплины, часы, связи)
+    читаются из файла при первом обращении к их атрибутам, так что программа,
+    которой нужна только часть плана, только за эту часть и платит.
+    Несколько разделов сразу за один проход по файлу загружает метод load().
+    Экономия есть только без кэша: снимок в кэше сохраняется с полностью
+    загруженным планом, так что при промахе кэша читаются все разделы
+    """
+    code: str
+    name: str
+    degree: int
+    program: str
     competence_keys: Dict[str, Competence]
     competence_codes: Dict[str, Competence]
     subject_keys: Dict[str, Subject]
     subject_codes: Dict[str, Subject]
-
-    def __init__(self, filename: str):
-        root = ElementTree.parse(filename).getroot()
-        plan = root.find('./{*}diffgram/{*}dsMMISDB')
-        oop1 = plan.find('./{*}ООП')
-        oop2 = oop1.find('./{*}ООП')
-        self.code: str = oop1.get('Шифр')
-        self.name: str = oop1.get('Название')
+    subject_children: Dict[str, List[Subject]]
+    indicator_competences: Dict[str, Competence]
+    subject_list: List[Subject]
+    subject_index: Dict[str, int]
+    subject_tokens: Dict[str, List[Subject]]
+    hours: np.ndarray
+
+    # Атрибуты плана по разделам
+    lazy_attrs = {
+        'code': SECTION_HEADER, 'name': SECTION_HEADER, 'degree': SECTION_HEADER, 'program': SECTION_HEADER,
+        'competence_keys': SECTION_COMPETENCES, 'competence_codes': SECTION_COMPETENCES,
+        'indicator_competences': SECTION_COMPETENCES,
+        'subject_keys': SECTION_SUBJECTS, 'subject_codes': SECTION_SUBJECTS, 'subject_children': SECTION_SUBJECTS,
+        'subject_list': SECTION_SUBJECTS, 'subject_index': SECTION_SUBJECTS, 'subject_tokens': SECTION_SUBJECTS,
+        'hours': SECTION_HOURS,
+    }
+
+    def __init__(self, filename: str, backend: str = None):
+        self.filename = filename
+        self.backend = backend
+        self.loaded: Set[str] = set()
+
+    def __getattr__(self, attr: str):
+        # Вызывается только для отсутствующих атрибутов: загружаем нужный раздел
+        section = type(self).lazy_attrs.get(attr)
+        if section is None or 'loaded' not in self.__dict__:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {attr!r}')
+        self.load(section)
+        return object.__getattribute__(self, attr)
+
+    def __getstate__(self):
+        # Снимок должен обходиться без исходного файла
+        self.load()
+        return self.__dict__
+
+    def load(self, *sections: str) -> 'EducationPlan':
+        """
+        Загрузить разделы плана (по умолчанию все) вместе с разделами,
+        от которых они зависят, за один проход по файлу
+        """
+        wanted = set(sections or SECTIONS)
+        for section in list(wanted):
+            wanted.update(SECTION_DEPENDENCIES.get(section, ()))
+        wanted -= self.loaded
+        if not wanted:
+            return self
+
+        if SECTION_HEADER in wanted:
+            self.code, self.name, self.degree, self.program = '', '', 0, ''
+        if SECTION_COMPETENCES in wanted:
+            self.competence_keys, self.competence_codes = {}, {}
+            # Обратный индекс для связывания: код индикатора -> компетенция, которой он принадлежит
+            self.indicator_competences = {}
+        if SECTION_SUBJECTS in wanted:
+            self.subject_keys, self.subject_codes = {}, {}
+            # Обратный индекс для связывания: код родителя -> дочерние дисциплины
+            self.subject_children = {}
+
+        # Часы и связи могут идти в файле раньше дисциплин и справочника,
+        # поэтому копим только атрибуты строк и разбираем их после прохода
+        work_types: List[Mapping[str, str]] = []
+        hours: List[Mapping[str, str]] = []
+        links: List[Mapping[str, str]] = []
+        header_wanted = SECTION_HEADER in wanted
+        hours_wanted = SECTION_HOURS in wanted
+
+        for tag, elem, attrs in iter_plan(self.filename, self.backend):
+            if tag == 'ООП' and header_wanted:
+                self.read_header(elem)
+                header_wanted = False
+                if wanted == {SECTION_HEADER}:
+                    break  # шапка идет в начале файла, дальше читать незачем
+            elif tag == 'ПланыКомпетенции' and SECTION_COMPETENCES in wanted:
+                competence = Competence.add_to_dicts(elem, self.competence_keys, self.competence_codes)
+                if competence:
+                    competence.plan = self
+                    for ind_key in competence.indicator_keys:
+                        self.indicator_competences.setdefault(ind_key, competence)
+            elif tag == 'ПланыСтроки' and SECTION_SUBJECTS in wanted:
+                subject = Subject.add_to_dicts(elem, self.subject_keys, self.subject_codes)
+                if subject:
+                    subject.plan = self
+                    self.subject_children.setdefault(subject.parent, []).append(subject)
+            elif tag == 'СправочникВидыРабот' and hours_wanted:
+                work_types.append(attrs)
+            elif tag == 'ПланыНовыеЧасы' and hours_wanted:
+                hours.append(attrs)
+            elif tag == 'ПланыКомпетенцииДисциплины' and SECTION_LINKS in wanted:
+                links.append(attrs)
+
+        if SECTION_SUBJECTS in wanted:
+            self.index_subjects()
+        if hours_wanted:
+            self.read_hours(work_types, hours)
+        if SECTION_LINKS in wanted:
+            self.read_links(links)
+        self.loaded |= wanted
+        return self
+
+    def read_header(self, oop1: Element) -> None:
+        """ Прочитать шифр, название и квалификацию ООП """
+        oop2 = oop1.find(get_namespace(oop1) + 'ООП')
+        self.code = oop1.get('Шифр')
+        self.name = oop1.get('Название')
         self.degree = int(oop1.get('Квалификация'))
-        self.program: str = '' if oop2 is None else oop2.get('Название')
-        self.competence_keys, self.competence_codes = Competence.get_dicts('ПланыКомпетенции', plan)
-        self.subject_keys, self.subject_codes = Subject.get_dicts('ПланыСтроки', plan)
-        self.read_hours(plan)
-        self.read_links(plan)
-
-    def read_hours(self, plan: Element) -> None:
-        """ Прочитать часы по дисциплинам """
+        self.program = '' if oop2 is None else oop2.get('Название')
+
+    def index_subjects(self) -> None:
+        """
+        Пронумеровать дисциплины в порядке плана (self.subject_list, self.subject_index)
+        и построить обратный индекс: нормализованное слово -> дисциплины с ним в названии
+        """
+        self.subject_list = list(self.subject_keys.values())
+        self.subject_index = {}
+        self.subject_tokens = {}
+        for index, subject in enumerate(self.subject_list):
+            subject.index = index
+            self.subject_index[subject.code] = index
+            for token in subject.tokens:
+                self.subject_tokens.setdefault(token, []).append(subject)
+
+    def read_hours(self, work_types: Iterable[Mapping[str, str]], hours_rows: Iterable[Mapping[str, str]]) -> None:
+        """
+        Прочитать часы по дисциплинам в общий массив self.hours:
+        дисциплина x семестр (номер - 1) x вид работы (WORK_INDEX) x тип часов.
+        Номер строки массива - Subject.index, по шифру его дает self.subject_index
+        """
 
         # Читаем справочник видов работ
         wt_abbr = {}
-        path = './{*}СправочникВидыРабот'
-        for work in plan.findall(path):
+        for work in work_types:
             wt_abbr[work.get('Код')] = work.get('Аббревиатура')
 
-        path = './{*}ПланыНовыеЧасы'
-        for hours in plan.findall(path):
+        rows = []
+        for hours in hours_rows:
 
             # Ищем предмет
             subj_key = hours.get('КодОбъекта')
@@ -257,82 +507,302 @@ class EducationPlan:
             hours_num = int(hours.get('Количество'))
             hours_type = hours.get('КодТипаЧасов')
             work_type = wt_abbr[hours.get('КодВидаРаботы')]
+            rows.append((subject, sem_num, hours_num, hours_type, work_type))
+
+        # Размер массива известен только после просмотра всех строк
+        semesters = max((row[1] for row in rows), default=0)
+        self.hours = get_hours_table(len(self.subject_list), semesters)
+        for subject in self.subject_list:
+            subject.table = self.hours
+            subject.semesters = {}
+            subject.first_semester = 0
+            subject.last_semester = 0
+
+        for subject, sem_num, hours_num, hours_type, work_type in rows:
             attr = WORK_TYPES.get(work_type)
-
             if work_type in (CT_CREDIT, CT_CREDIT_GRADE, CT_EXAM, CT_COURSEWORK):
                 # Форма контроля
-                sem_work = subject.semesters.setdefault(sem_num, SemesterWork())
+                sem_work = self.get_semester_work(subject, sem_num)
                 sem_work.control.add(work_type)
             elif hours_type == HT_REGULAR and attr:
                 # Обычные часы
-                sem_work = subject.semesters.setdefault(sem_num, SemesterWork())
-                sem_work.__setattr__(attr, hours_num)
+                self.get_semester_work(subject, sem_num)
+                self.hours[subject.index, sem_num - 1, WORK_INDEX[attr], KIND_REGULAR] = hours_num
             elif hours_type == HT_PRACTICAL and attr:
                 # Практическая подготовка
-                sem_work = subject.semesters.setdefault(sem_num, SemesterWork())
-                sem_work.__setattr__(attr + '_pp', hours_num)
-
-    def read_links(self, elem: Element) -> None:
+                self.get_semester_work(subject, sem_num)
+                self.hours[subject.index, sem_num - 1, WORK_INDEX[attr], KIND_PRACTICAL] = hours_num
+
+        for subject in self.subject_list:
+            if subject.semesters:
+                subject.first_semester = min(subject.semesters)
+                subject.last_semester = max(subject.semesters)
+
+    def get_semester_work(self, subject: Subject, sem_num: int) -> SemesterWork:
+        """ Трудоемкость дисциплины в семестре, создается при первом обращении """
+        sem_work = subject.semesters.get(sem_num)
+        if sem_work is None:
+            sem_work = SemesterWork(self.hours, subject.index, sem_num - 1)
+            subject.semesters[sem_num] = sem_work
+        return sem_work
+
+    def read_links(self, links: Iterable[Mapping[str, str]]) -> None:
         """ Прочитать связи дисциплин с компетенциями """
-        path = './{*}ПланыКомпетенцииДисциплины'
-        for sub_elem in elem.findall(path):
+        for subject in self.subject_list:
+            subject.competencies = set()
+        for competence in self.competence_keys.values():
+            competence.subjects = set()
+
+        for sub_elem in links:
             k = sub_elem.get('КодСтроки')
-            subjects = [
-                s for s in self.subject_keys.values()
-                if s.key == k or s.parent == k
-            ]
+            subjects = list(self.subject_children.get(k, []))
+            subject = self.subject_keys.get(k)
+            if subject and subject.parent != k:
+                subjects.append(subject)
 
             k = sub_elem.get('КодКомпетенции')
-            competences = [
-                c for c in self.competence_keys.values()
-                if c.key == k or k in c.indicator_keys
-            ]
+            competences = []
+            competence = self.competence_keys.get(k)
+            if competence:
+                competences.append(competence)
+            competence = self.indicator_competences.get(k)
+            if competence and competence.key != k:
+                competences.append(competence)
 
             for subj in subjects:
                 for comp in competences:
                     comp.subjects.add(subj.code)
                     subj.competencies.add(comp.code)
 
+    def find_subjects(self, names: Set[str]) -> List[Subject]:
+        """ Дисциплины, в названии которых есть все слова names, в порядке плана """
+        tokens = get_tokens(names)
+        if not tokens:
+            return list(self.subject_list)
+        postings = [self.subject_tokens.get(token, []) for token in tokens]
+        shortest = min(postings, key=len)
+        return [subject for subject in shortest if tokens <= subject.tokens]
+
     def find_subject(self, course_names: List[Set[str]]) -> Subject:
-        """ Ищем дисциплину в учебном плане """
+        """ Ищем дисциплину в учебном плане: первую по порядку плана, подходящую под любой вариант названия """
         result = None
-        for subject in self.subject_keys.values():
-            subject_names = set(subject.name.lower().split())
-            for names in course_names:
-                if names <= subject_names:
-                    result = subject
-                    break
+        for names in course_names:
+            subjects = self.find_subjects(names)
+            if subjects and (result is None or subjects[0].index < result.index):
+                result = subjects[0]
         return result
 
     def find_dependencies(self, subject: Subject, course: 'Course') -> Tuple[str, str]:
         """ Ищем зависимости """
-        semesters = subject.semesters.keys()
-        first, last = min(semesters), max(semesters)
         before, after = set(), set()
-        for cur_subj in self.subject_keys.values():
-            subject_names = set(cur_subj.name.lower().split())
-            for names in course.links:
-                if names <= subject_names:
-                    semesters = cur_subj.semesters.keys()
-                    if max(semesters) < first:
-                        before.add('%s %s' % (cur_subj.code, cur_subj.name))
-                    if last < min(semesters):
-                        after.add('%s %s' % (cur_subj.code, cur_subj.name))
+        if not subject.semesters:
+            return '', ''
+        for names in course.links:
+            for cur_subj in self.find_subjects(names):
+                if not cur_subj.semesters:
+                    continue
+                if cur_subj.last_semester < subject.first_semester:
+                    before.add('%s %s' % (cur_subj.code, cur_subj.name))
+                if subject.last_semester < cur_subj.first_semester:
+                    after.add('%s %s' % (cur_subj.code, cur_subj.name))
         return ', '.join(before), ', '.join(after)
 
 
-def get_plan(plan_filename: str) -> 'EducationPlan':
-    """ Читаем учебный план """
+def get_namespace(elem: Element) -> str:
+    """ Пространство имен элемента в виде префикса тега '{...}' """
+    tag = elem.tag
+    return tag[:tag.find('}') + 1]
+
+
+def iter_plan(filename: str, backend: str = None) -> Iterator[Tuple[str, Element, Dict[str, str]]]:
+    """
+    Потоковое чтение учебного плана: выдает имя, элемент и словарь атрибутов каждой
+    строки таблиц плана (прямых потомков dsMMISDB). Элемент вместе с вложенными
+    действителен только до следующей итерации, словарь атрибутов можно сохранять
+    """
+    backend = get_backend(backend)
+    if backend == BACKEND_LXML:
+        return iter_plan_lxml(filename)
+    return iter_plan_etree(filename)
+
+
+def get_backend(backend: str = None) -> str:
+    """ Выбрать разборщик XML: явно заданный, из окружения или по умолчанию; без lxml - стандартный """
+    backend = backend or os.environ.get(ENV_XML_BACKEND) or DEFAULT_BACKEND
+    if backend not in (BACKEND_LXML, BACKEND_ETREE):
+        raise ValueError(f'Неизвестный разборщик XML: {backend}')
+    if backend == BACKEND_LXML and lxml_etree is None:
+        backend = BACKEND_ETREE
+    return backend
+
+
+def iter_plan_etree(filename: str) -> Iterator[Tuple[str, Element, Dict[str, str]]]:
+    """
+    Чтение плана стандартной библиотекой. После обработки строка удаляется
+    из дерева, так что целиком документ в памяти не держится
+    """
+    path: List[str] = []
+    tables = None
+    for event, elem in ElementTree.iterparse(filename, events=('start', 'end')):
+        tag = elem.tag.rpartition('}')[2]
+        if event == 'start':
+            path.append(tag)
+            if tuple(path[1:]) == PLAN_PATH:
+                tables = elem
+            continue
+
+        path.pop()
+        if len(path) == 3 and tuple(path[1:]) == PLAN_PATH:
+            if tag in PLAN_TABLES:
+                yield tag, elem, elem.attrib
+            # Разобранная строка больше не нужна: отцепляем её от дерева вместе с потомками.
+            # clear() не вызываем, чтобы не испортить отданный словарь атрибутов
+            tables.remove(elem)
+        elif len(path) == 1 and tag != PLAN_PATH[0]:
+            # Схема данных и прочие разделы вне diffgram нам не нужны
+            elem.clear()
+
+
+def iter_plan_lxml(filename: str, cleanup_every: int = 512) -> Iterator[Tuple[str, Element, Dict[str, str]]]:
+    """
+    Чтение плана через lxml: события генерируются только для нужных таблиц
+    (фильтр по тегам с маской пространства имен работает внутри libxml2),
+    разобранные строки удаляются из дерева пачками по cleanup_every штук
+    """
+    tags = [f'{{*}}{name}' for name in PLAN_TABLES]
+    suffix = '}' + PLAN_PATH[1]
+    count = 0
+    events = lxml_etree.iterparse(
+        filename, events=('end',), tag=tags, huge_tree=True, collect_ids=False, remove_blank_text=True,
+    )
+    for _, elem in events:
+        tag = elem.tag.rpartition('}')[2]
+        if tag in NESTED_TABLES and not elem.getparent().tag.endswith(suffix):
+            continue  # вложенные строки разбирает владелец
+
+        yield tag, elem, dict(elem.items())
+
+        count += 1
+        if count % cleanup_every == 0:
+            parent = elem.getparent()
+            del parent[:parent.index(elem)]
+
+
+def get_plan(plan_filename: Union[str, EducationPlan], use_cache: bool = None,
+             cache_dir: str = None) -> 'EducationPlan':
+    """
+    Читаем учебный план. Если кэш не отключен (параметром или переменной
+    окружения ENIGMA_NO_CACHE), то разобранный план берется из снимка на диске,
+    а при промахе кэша читается целиком, чтобы сохранить снимок. Без кэша
+    разделы плана читаются по мере обращения к ним.
+    Для пакетной работы можно передать уже прочитанный план, он вернется как есть
+    """
+    if isinstance(plan_filename, EducationPlan):
+        return plan_filename
+    if use_cache is None:
+        use_cache = cache.is_enabled()
     try:
-        if isinstance(plan_filename, EducationPlan):
-            raise ValueError()
-        plan = EducationPlan(plan_filename)
+        if use_cache:
+            plan = cache.load(plan_filename, 'plans', LOADER_VERSION, EducationPlan, cache_dir)
+            plan.filename = plan_filename  # снимок мог быть сделан с копии файла под другим именем
+        else:
+            # Шапка лежит в начале файла: заодно сразу проверим, что план читается
+            plan = EducationPlan(plan_filename).load(SECTION_HEADER)
     except OSError:
         print('Не могу открыть учебный план %s' % plan_filename)
         sys.exit()
-    except ValueError:
-        # для пакетной работы: нам могут дать готовый EducationPlan, тогда не будем парсить
-        plan = plan_filename
-        import traceback
-        traceback.print_stack()
     return plan
+
+
+def set_memory_limit(megabytes: int) -> None:
+    """ Ограничить адресное пространство процесса (только для Unix) """
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return
+    limit = megabytes * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def load_plan(filename: str, use_cache: bool = None, cache_dir: str = None) -> Tuple[str, 'EducationPlan', str]:
+    """
+    Прочитать один учебный план для load_plans. В отличие от get_plan не
+    завершает программу, а возвращает (имя файла, план или None, текст ошибки)
+    """
+    if use_cache is None:
+        use_cache = cache.is_enabled()
+    try:
+        if use_cache:
+            plan = cache.load(filename, 'plans', LOADER_VERSION, EducationPlan, cache_dir)
+        else:
+            plan = EducationPlan(filename).load()
+    except MemoryError:
+        return filename, None, 'Превышен лимит памяти'
+    except Exception as error:  # pylint: disable=broad-except
+        return filename, None, f'{type(error).__name__}: {error}'
+    return filename, plan, ''
+
+
+def get_plans_pool(filenames: List[str], workers: int, memory_limit: int = None, use_cache: bool = None,
+                   cache_dir: str = None) -> Tuple[List[Tuple[str, 'EducationPlan', str]], List[str]]:
+    """
+    Прочитать планы в пуле из workers процессов. Возвращает результаты load_plan
+    и по порядку файлы, которые не дочитаны, потому что процесс пула упал
+    (например, при нехватке памяти) и пул сломался
+    """
+    initializer, initargs = None, ()
+    if memory_limit:
+        initializer, initargs = set_memory_limit, (memory_limit,)
+
+    results, unfinished = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        jobs = [executor.submit(load_plan, filename, use_cache, cache_dir) for filename in filenames]
+        for filename, job in zip(filenames, jobs):
+            try:
+                results.append(job.result())
+            except BrokenProcessPool:
+                unfinished.append(filename)
+            except MemoryError:
+                results.append((filename, None, 'Превышен лимит памяти'))
+            except Exception as exc:  # pylint: disable=broad-except
+                results.append((filename, None, f'{type(exc).__name__}: {exc}'))
+    return results, unfinished
+
+
+def load_plans(directory: str, workers: int = None, memory_limit: int = None,
+               use_cache: bool = None, cache_dir: str = None) -> Tuple[Dict[str, EducationPlan], Dict[str, str]]:
+    """
+    Прочитать все учебные планы *.plx из каталога в пуле процессов.
+    Возвращает словарь планов и словарь ошибок, оба по имени файла без расширения
+    (шифр ООП для этого не годится: он совпадает у планов разных лет набора).
+    workers ограничивает число процессов, memory_limit - память каждого из них в МБ.
+    Если процесс упал, ошибка записывается только плану, который он читал,
+    остальные планы дочитываются в новом пуле
+    """
+    filenames = sorted(
+        os.path.join(directory, filename) for filename in os.listdir(directory)
+        if filename.lower().endswith('.plx')
+    )
+    plans, errors = {}, {}
+    if not filenames:
+        return plans, errors
+
+    workers = min(workers or os.cpu_count() or 1, len(filenames))
+    pending, pool_size = filenames, workers
+    while pending:
+        results, pending = get_plans_pool(pending, pool_size, memory_limit, use_cache, cache_dir)
+        for filename, plan, error in results:
+            stem = os.path.splitext(os.path.basename(filename))[0]
+            if plan is None:
+                errors[stem] = error
+            else:
+                plans[stem] = plan
+        if pending and pool_size == 1:
+            # Один процесс читает планы по очереди: упал на первом недочитанном
+            stem = os.path.splitext(os.path.basename(pending[0]))[0]
+            errors[stem] = 'Процесс чтения плана завершился аварийно (возможно, превышен лимит памяти)'
+            pending, pool_size = pending[1:], workers
+        elif pending:
+            # Какой из одновременно читавшихся планов уронил процесс, неизвестно: дочитываем по одному
+            pool_size = 1
+    return plans, errors
@@ -0,0 +1,47 @@
+"""
+Текст таблицы документа с прямоугольной сеткой.
+
+Ячейки хранятся по строкам в одном списке, а строки и столбцы - его срезы,
+поэтому для обращения к ячейкам извлеченных таблиц не нужны pandas и numpy.
+"""
+from typing import Iterable, List
+
+
+class Grid:
+    """
+    Таблица rows x columns. Если ячеек не хватает на последнюю строку,
+    она отбрасывается. Индексы, как у списков, могут быть отрицательными
+    """
+    __slots__ = ('cells', 'rows', 'columns')
+
+    def __init__(self, cells: List[str], columns: int):
+        self.columns = columns
+        self.rows = len(cells) // columns if columns > 0 else 0
+        self.cells = cells[:self.rows * columns]
+
+    def _row_index(self, row: int) -> int:
+        if not -self.rows <= row < self.rows:
+            raise IndexError(f'Нет строки {row} в таблице из {self.rows} строк')
+        return row % self.rows
+
+    def _column_index(self, column: int) -> int:
+        if not -self.columns <= column < self.columns:
+            raise IndexError(f'Нет столбца {column} в таблице из {self.columns} столбцов')
+        return column % self.columns
+
+    def cell(self, row: int, column: int) -> str:
+        """ Текст ячейки """
+        return self.cells[self._row_index(row) * self.columns + self._column_index(column)]
+
+    def row(self, row: int) -> List[str]:
+        """ Строка таблицы """
+        start = self._row_index(row) * self.columns
+        return self.cells[start:start + self.columns]
+
+    def column(self, column: int) -> List[str]:
+        """ Столбец таблицы вместе с заголовком """
+        return self.cells[self._column_index(column)::self.columns]
+
+    def has_header(self, words: Iterable[str], column: int = -1) -> bool:
+        """ Есть ли в заголовке столбца column хотя бы одно из слов words """
+        return self.rows > 0 and any(word in self.cell(0, column) for word in words)
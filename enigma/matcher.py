@@ -0,0 +1,175 @@
+"""
+Поиск файлов по названию дисциплины: сканов титульных листов и списков
+литературы для РПД, готовых РПД для ФОС.
+
+Каталог читается один раз и индексируется: имена файлов без расширения
+приводятся к NFC, одинаковые имена с разными расширениями склеиваются, а по
+триграммам имен строится инвертированный индекс. Точное расстояние Левенштейна
+считается только для кандидатов, у которых нижняя оценка расстояния по общим
+триграммам не хуже уже найденного лучшего, поэтому результат тот же, что
+при переборе всех файлов, но расстояний считается в разы меньше.
+
+Имена РПД начинаются с кода дисциплины («Б1.О.01 Физика.docx»), поэтому
+имена индексируются и по первому слову: если передан код дисциплины и файл
+с таким кодом есть, он находится сразу, без нечеткого поиска.
+
+Многостраничные сканы - это файлы, имена которых начинаются с имени лучшего
+совпадения (например, «Физика.jpg», «Физика 2.jpg»): они находятся
+бинарным поиском по отсортированным именам.
+"""
+import bisect
+import heapq
+import math
+import os
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from Levenshtein import distance as levenshtein_d  # pylint: disable=no-name-in-module
+
+NGRAM = 3
+
+# Индексы каталогов: (полный путь, расширение) -> (время изменения каталога, индекс)
+_indexes: Dict[Tuple[str, str], Tuple[int, 'FileIndex']] = {}
+
+
+def normalize(name: str) -> str:
+    """ Имена файлов в macOS хранятся в NFD, а названия дисциплин в плане - в NFC """
+    return unicodedata.normalize('NFC', name)
+
+
+def get_ngrams(text: str) -> Counter:
+    """ Мультимножество n-грамм строки """
+    return Counter(text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1))
+
+
+def lower_bound(length1: int, length2: int, shared: int) -> int:
+    """
+    Нижняя оценка расстояния Левенштейна по длинам строк и числу общих n-грамм:
+    одна правка портит не больше NGRAM n-грамм, и расстояние не меньше разницы длин
+    """
+    return max(abs(length1 - length2), (max(length1, length2) - shared) // NGRAM, 0)
+
+
+def get_confidence(name: str, stem: str, distance: int) -> float:
+    """ Уверенность в совпадении от 0 до 1: доля символов, которые править не пришлось """
+    return 1 - distance / max(len(name), len(stem), 1)
+
+
+class Match(NamedTuple):
+    """ Лучшее совпадение имени файла с названием """
+    stem: str  # имя файла без расширения
+    filename: str  # файл с этим именем
+    distance: int  # расстояние Левенштейна до названия
+    files: List[str]  # все страницы скана: файлы, имена которых начинаются с stem
+    confidence: float  # см. get_confidence; 1 - если файл найден по коду дисциплины
+
+
+class FileIndex:
+    """ Индекс имен файлов одного каталога; suffix - расширение нужных файлов, пустое - все файлы """
+    def __init__(self, path: str, suffix: str = ''):
+        self.path = path
+        self.names: List[str] = []  # имена файлов каталога (NFC), отсортированы для поиска по префиксу
+        self.files: List[str] = []  # полные пути в том же порядке
+        self.stems: List[str] = []  # уникальные имена без расширения
+        self.stem_files: List[str] = []  # первый файл с таким именем
+        # n-грамма -> списки номеров имен, в которых она встречается хотя бы 1, 2, ... раз
+        self.postings: Dict[str, List[List[int]]] = defaultdict(list)
+        self.lengths: Dict[int, List[int]] = defaultdict(list)  # длина имени -> номера имен
+        self.codes: Dict[str, List[int]] = defaultdict(list)  # первое слово имени (код дисциплины) -> номера имен
+
+        # Скрытые файлы и временные файлы Word (~$...) пропускаются
+        with os.scandir(path) as entries:
+            files = sorted(
+                (normalize(entry.name), entry.path) for entry in entries
+                if not entry.name.startswith(('.', '~')) and entry.name.endswith(suffix) and entry.is_file()
+            )
+        stem_numbers: Dict[str, int] = {}
+        for name, filename in files:
+            self.names.append(name)
+            self.files.append(filename)
+            stem = os.path.splitext(name)[0]
+            if stem in stem_numbers:
+                continue
+            number = stem_numbers[stem] = len(self.stems)
+            self.stems.append(stem)
+            self.stem_files.append(filename)
+            self.lengths[len(stem)].append(number)
+            self.codes[stem.split(' ', 1)[0]].append(number)
+            for ngram, count in get_ngrams(stem).items():
+                levels = self.postings[ngram]
+                levels += [[] for _ in range(count - len(levels))]
+                for level in levels[:count]:
+                    level.append(number)
+
+    def get_prefixed(self, prefix: str) -> List[str]:
+        """ Файлы, имена которых начинаются с prefix """
+        start = bisect.bisect_left(self.names, prefix)
+        end = start
+        while end < len(self.names) and self.names[end].startswith(prefix):
+            end += 1
+        return self.files[start:end]
+
+    def get_queue(self, name: str) -> Tuple[List[Tuple[int, int, int]], Counter]:
+        """
+        Очередь кандидатов для find в порядке нижней оценки расстояния до name:
+        (оценка, 0, номер имени) или, для имен без общих с name n-грамм, которые
+        оцениваются только по длине и проверяются целыми группами, (оценка, 1, длина).
+        Вторым значением возвращается число общих n-грамм с каждым именем, где они есть
+        """
+        # n-грамма, которая встречается в name count раз, учитывается не больше count раз
+        shared: Counter = Counter()
+        for ngram, count in get_ngrams(name).items():
+            for level in self.postings.get(ngram, [])[:count]:
+                shared.update(level)
+
+        length = len(name)
+        queue = [(lower_bound(length, len(self.stems[number]), count), 0, number) for number, count in shared.items()]
+        queue += [(lower_bound(length, stem_length, 0), 1, stem_length) for stem_length in self.lengths]
+        heapq.heapify(queue)
+        return queue, shared
+
+    def find(self, name: str, code: str = None) -> Optional[Match]:
+        """
+        Имя файла, ближайшее к name по Левенштейну; None - если каталог пуст.
+        Если задан код дисциплины code и есть имена, начинающиеся с этого кода,
+        выбирается ближайшее из них
+        """
+        if not self.stems:
+            return None
+        name = normalize(name)
+        numbers = self.codes.get(normalize(code)) if code else None
+        if numbers:
+            distance, stem, number = min((levenshtein_d(name, self.stems[n]), self.stems[n], n) for n in numbers)
+            return Match(stem, self.stem_files[number], distance, self.get_prefixed(stem), 1.0)
+
+        queue, shared = self.get_queue(name)
+
+        # (расстояние, имя, номер имени): при равенстве расстояний - первое по алфавиту
+        best: Optional[Tuple[int, str, int]] = None
+        best_distance = math.inf
+        while queue:
+            bound, is_group, key = heapq.heappop(queue)
+            if bound > best_distance:
+                break
+            numbers = [n for n in self.lengths[key] if n not in shared] if is_group else [key]
+            for number in numbers:
+                candidate = levenshtein_d(name, self.stems[number]), self.stems[number], number
+                if best is None or candidate < best:
+                    best, best_distance = candidate, candidate[0]
+
+        distance, stem, number = best
+        return Match(
+            stem, self.stem_files[number], distance, self.get_prefixed(stem), get_confidence(name, stem, distance),
+        )
+
+
+def get_index(path: str, suffix: str = '') -> FileIndex:
+    """ Индекс каталога из кэша; если в каталоге добавились или удалились файлы, он строится заново """
+    key = os.path.abspath(path), suffix
+    mtime = os.stat(key[0]).st_mtime_ns
+    cached = _indexes.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = mtime, FileIndex(*key)
+        _indexes[key] = cached
+    return cached[1]
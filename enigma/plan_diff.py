@@ -0,0 +1,154 @@
+"""
+Сравнение двух версий рабочего учебного плана.
+
+По результату сравнения видно, какие РПД и строки ФОС нужно пересоздать
+после переэкспорта РУПа, вместо того чтобы генерировать всё заново.
+"""
+from typing import Any, Dict, List, NamedTuple, Set
+
+import numpy as np
+
+from .education_plan import Competence, EducationPlan, Subject
+
+# Что может поменяться у дисциплины
+SC_ADDED = 'added'
+SC_REMOVED = 'removed'
+SC_NAME = 'name'
+SC_HOURS = 'hours'
+SC_SEMESTERS = 'semesters'
+SC_CONTROLS = 'controls'
+SC_COMPETENCIES = 'competencies'
+
+# Что может поменяться у компетенции
+CC_ADDED = 'added'
+CC_REMOVED = 'removed'
+CC_DESCRIPTION = 'description'
+CC_INDICATORS = 'indicators'
+
+
+class PlanDiff(NamedTuple):
+    """ Изменения между двумя версиями плана: шифр -> множество видов изменений """
+    subjects: Dict[str, Set[str]]  # словари строит diff_plans, у каждого сравнения свои
+    competences: Dict[str, Set[str]]
+    # Компетенции измененных и удаленных дисциплин по старому плану: ссылки на них из нового плана уже нет
+    old_competences: Dict[str, Set[str]]
+    header: bool = False  # шифр, название, профиль или квалификация ООП - попадают во все документы
+
+    def is_empty(self) -> bool:
+        """ Планы совпадают во всем, что попадает в РПД и ФОС """
+        return not self.subjects and not self.competences and not self.header
+
+    def affected_subjects(self, plan: EducationPlan) -> Set[str]:
+        """
+        Шифры дисциплин нового плана, РПД которых нужно пересоздать: измененные
+        дисциплины и дисциплины, связанные с измененными компетенциями
+        """
+        if self.header:
+            return set(plan.subject_codes)
+        result = {code for code, changes in self.subjects.items() if SC_REMOVED not in changes}
+        for code in self.competences:
+            competence = plan.competence_codes.get(code)
+            if competence:
+                result |= competence.subjects
+        return result & set(plan.subject_codes)
+
+    def affected_competences(self, plan: EducationPlan) -> Set[str]:
+        """
+        Шифры компетенций нового плана, строки ФОС которых нужно пересоздать:
+        измененные компетенции и компетенции измененных дисциплин, в том числе
+        те, с которыми дисциплина была связана в старом плане
+        """
+        if self.header:
+            return set(plan.competence_codes)
+        result = {code for code, changes in self.competences.items() if CC_REMOVED not in changes}
+        for code in self.subjects:
+            subject = plan.subject_codes.get(code)
+            if subject:
+                result |= subject.competencies
+            result |= self.old_competences.get(code, set())
+        return result & set(plan.competence_codes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ Для вывода в JSON """
+        return {
+            'header': self.header,
+            'subjects': {code: sorted(changes) for code, changes in sorted(self.subjects.items())},
+            'competences': {code: sorted(changes) for code, changes in sorted(self.competences.items())},
+        }
+
+
+def get_controls(subject: Subject) -> Dict[int, Set[str]]:
+    """ Формы контроля по семестрам """
+    return {number: semester.control for number, semester in subject.semesters.items()}
+
+
+def get_indicators(competence: Competence) -> Dict[str, str]:
+    """ Индикаторы компетенции: шифр -> описание """
+    return {code: indicator.description for code, indicator in competence.indicator_codes.items()}
+
+
+def diff_hours(old: EducationPlan, new: EducationPlan, codes: List[str]) -> Set[str]:
+    """ Шифры дисциплин, у которых изменились часы: одно векторное сравнение по всем дисциплинам """
+    if not codes:
+        return set()
+    old_hours = old.hours[[old.subject_codes[code].index for code in codes]]
+    new_hours = new.hours[[new.subject_codes[code].index for code in codes]]
+
+    # Число семестров в планах может отличаться: дополняем нулями
+    semesters = max(old_hours.shape[1], new_hours.shape[1])
+    old_hours = np.pad(old_hours, ((0, 0), (0, semesters - old_hours.shape[1]), (0, 0), (0, 0)))
+    new_hours = np.pad(new_hours, ((0, 0), (0, semesters - new_hours.shape[1]), (0, 0), (0, 0)))
+
+    changed = (old_hours != new_hours).any(axis=(1, 2, 3))
+    return {code for code, flag in zip(codes, changed) if flag}
+
+
+def diff_plans(old: EducationPlan, new: EducationPlan) -> PlanDiff:
+    """ Сравнить две версии учебного плана """
+    # Сравниваются все разделы: загружаем их сразу, а не по одному проходу на раздел
+    old.load()
+    new.load()
+    header = (old.code, old.name, old.program, old.degree) != (new.code, new.name, new.program, new.degree)
+
+    subjects: Dict[str, Set[str]] = {}
+    for code in old.subject_codes.keys() - new.subject_codes.keys():
+        subjects[code] = {SC_REMOVED}
+    for code in new.subject_codes.keys() - old.subject_codes.keys():
+        subjects[code] = {SC_ADDED}
+
+    common = sorted(old.subject_codes.keys() & new.subject_codes.keys())
+    for code in diff_hours(old, new, common):
+        subjects.setdefault(code, set()).add(SC_HOURS)
+    for code in common:
+        old_subj, new_subj = old.subject_codes[code], new.subject_codes[code]
+        changes = set()
+        if old_subj.name != new_subj.name:
+            changes.add(SC_NAME)
+        if old_subj.semesters.keys() != new_subj.semesters.keys():
+            changes.add(SC_SEMESTERS)
+        if get_controls(old_subj) != get_controls(new_subj):
+            changes.add(SC_CONTROLS)
+        if old_subj.competencies != new_subj.competencies:
+            changes.add(SC_COMPETENCIES)
+        if changes:
+            subjects.setdefault(code, set()).update(changes)
+    old_competences = {
+        code: set(old.subject_codes[code].competencies) for code in subjects if code in old.subject_codes
+    }
+
+    competences: Dict[str, Set[str]] = {}
+    for code in old.competence_codes.keys() - new.competence_codes.keys():
+        competences[code] = {CC_REMOVED}
+    for code in new.competence_codes.keys() - old.competence_codes.keys():
+        competences[code] = {CC_ADDED}
+    for code in old.competence_codes.keys() & new.competence_codes.keys():
+        old_comp, new_comp = old.competence_codes[code], new.competence_codes[code]
+        changes = set()
+        if old_comp.description != new_comp.description:
+            changes.add(CC_DESCRIPTION)
+        if get_indicators(old_comp) != get_indicators(new_comp):
+            changes.add(CC_INDICATORS)
+        if changes:
+            competences[code] = changes
+
+    return PlanDiff(subjects=subjects, competences=competences, old_competences=old_competences, header=header)
@@ -0,0 +1,218 @@
+"""
+Замеры стадий генерации документов: время и пик памяти.
+
+Включаются ключом --profile у скриптов (см. add_arguments). Код генерации
+размечает стадии конструкцией `with profiling.stage('render'): ...`; пока
+замеры не включены, разметка ничего не делает. Стадии с одинаковым именем
+суммируются: например, все вызовы find_rpd при заполнении ФОС.
+
+Память считается через tracemalloc как прирост пика выделенной Python памяти
+относительно начала стадии. tracemalloc заметно замедляет программу, поэтому
+время под --profile больше обычного, но соотношение стадий сохраняется.
+
+В пакетном режиме стадии каждого документа группируются (document), и в отчет
+добавляются процентили по документам. Результат печатается в виде таблицы и
+записывается в JSON.
+"""
+import argparse
+import contextlib
+import json
+import math
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_FILE = 'profile.json'
+PERCENTILES = (50, 90, 99)
+
+Stages = Dict[str, Dict[str, float]]  # имя стадии -> {'calls', 'wall', 'peak'}
+
+
+class Profiler:
+    """ Накопленные замеры одного процесса """
+    def __init__(self):
+        self.stages: Stages = {}  # стадии вне документов (чтение плана, общие шаги)
+        self.documents: List[Dict[str, Any]] = []  # {'name', 'wall', 'peak', 'stages'} по документам
+        self.current: Optional[Dict[str, Any]] = None  # документ, который сейчас создается
+        self.frames: List[Dict[str, int]] = []  # пики памяти вложенных стадий
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """ Замерить стадию """
+        start_memory, peak = tracemalloc.get_traced_memory()
+        if self.frames:
+            # Счетчик пика общий: перед сбросом запоминаем пик внешней стадии до этого момента
+            self.frames[-1]['peak'] = max(self.frames[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame = {'peak': 0}
+        self.frames.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            self.frames.pop()
+            if self.frames:
+                # Пик вложенной стадии входит и в пик внешней
+                self.frames[-1]['peak'] = max(self.frames[-1]['peak'], peak)
+            stages = self.current['stages'] if self.current is not None else self.stages
+            record = stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'peak': 0})
+            record['calls'] += 1
+            record['wall'] += wall
+            record['peak'] = max(record['peak'], peak - start_memory)
+
+    @contextlib.contextmanager
+    def document(self, name: str) -> Iterator[None]:
+        """ Замерить создание одного документа со всеми его стадиями """
+        self.current = {'name': name, 'wall': 0.0, 'peak': 0, 'stages': {}}
+        try:
+            with self.stage('total'):
+                yield
+        finally:
+            finished, self.current = self.current, None
+            total = finished['stages'].pop('total')
+            finished['wall'], finished['peak'] = total['wall'], total['peak']
+            self.documents.append(finished)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def start() -> None:
+    """ Включить замеры в этом процессе """
+    global _profiler  # pylint: disable=global-statement
+    if _profiler is None:
+        _profiler = Profiler()
+        tracemalloc.start()
+
+
+def is_enabled() -> bool:
+    """ Включены ли замеры """
+    return _profiler is not None
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """ Замерить стадию, если замеры включены """
+    if _profiler is None:
+        yield
+        return
+    with _profiler.stage(name):
+        yield
+
+
+@contextlib.contextmanager
+def document(name: str) -> Iterator[None]:
+    """ Замерить документ, если замеры включены """
+    if _profiler is None:
+        yield
+        return
+    with _profiler.document(name):
+        yield
+
+
+def pop_document() -> Optional[Dict[str, Any]]:
+    """ Забрать замеры последнего документа, например, чтобы передать их из процесса пула """
+    if _profiler is None or not _profiler.documents:
+        return None
+    return _profiler.documents.pop()
+
+
+def add_document(data: Optional[Dict[str, Any]]) -> None:
+    """ Добавить замеры документа, полученные из процесса пула """
+    if _profiler is not None and data is not None:
+        _profiler.documents.append(data)
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """ Процентиль по методу ближайшего ранга """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def get_distribution(values: List[float]) -> Dict[str, float]:
+    """ Процентили, минимум и максимум """
+    result = {f'p{percent}': percentile(values, percent) for percent in PERCENTILES}
+    result['min'], result['max'] = min(values), max(values)
+    return result
+
+
+def get_peak_rss() -> Optional[int]:
+    """ Пик резидентной памяти процесса, байт (только Unix) """
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def collect() -> Dict[str, Any]:
+    """ Все замеры и сводка по документам """
+    result = {'stages': _profiler.stages, 'documents': _profiler.documents, 'peak_rss': get_peak_rss()}
+    documents = _profiler.documents
+    if documents:
+        totals: Dict[str, List[float]] = {}
+        for doc in documents:
+            for name, record in doc['stages'].items():
+                totals.setdefault(name, []).append(record['wall'])
+        result['summary'] = {
+            'documents': len(documents),
+            'wall': get_distribution([doc['wall'] for doc in documents]),
+            'peak': get_distribution([doc['peak'] for doc in documents]),
+            'stages': {name: dict(get_distribution(values), total=sum(values)) for name, values in totals.items()},
+        }
+    return result
+
+
+def format_stages(stages: Stages) -> List[str]:
+    """ Строки таблицы стадий """
+    lines = []
+    for name, record in stages.items():
+        lines.append(f'  {name:<24}{record["wall"]:>10.3f} с{record["peak"] / 2**20:>10.1f} МБ{record["calls"]:>8}')
+    return lines
+
+
+def get_summary(data: Dict[str, Any]) -> str:
+    """ Сводка замеров для вывода на экран """
+    lines = [f'  {"стадия":<24}{"время":>12}{"пик памяти":>13}{"вызовов":>8}']
+    lines += format_stages(data['stages'])
+    summary = data.get('summary')
+    if summary and summary['documents'] == 1:
+        lines.append(f'Документ {data["documents"][0]["name"]}:')
+        lines += format_stages(data['documents'][0]['stages'])
+    elif summary:
+        names = ''.join(f'{f"p{percent}":>10}' for percent in PERCENTILES)
+        lines.append(f'Документов: {summary["documents"]}, время по документам, с:')
+        lines.append(f'  {"стадия":<24}{names}{"max":>10}{"всего":>10}')
+        rows = [('документ', dict(summary['wall'], total=sum(doc['wall'] for doc in data['documents'])))]
+        rows += list(summary['stages'].items())
+        for name, values in rows:
+            cells = ''.join(f'{values[f"p{percent}"]:>10.3f}' for percent in PERCENTILES)
+            lines.append(f'  {name:<24}{cells}{values["max"]:>10.3f}{values["total"]:>10.3f}')
+    if data['peak_rss']:
+        lines.append(f'Пик памяти процесса: {data["peak_rss"] / 2**20:.1f} МБ')
+    return '\n'.join(lines)
+
+
+def report(filename: str = DEFAULT_FILE) -> None:
+    """ Вывести сводку и записать замеры в JSON, если замеры включены """
+    if _profiler is None:
+        return
+    data = collect()
+    print('Замеры:')
+    print(get_summary(data))
+    try:
+        with open(filename, 'w', encoding='utf-8') as output_file:
+            json.dump(data, output_file, ensure_ascii=False, indent=2)
+        print(f'Замеры записаны в {filename}')
+    except OSError as error:
+        print(f'Не могу записать замеры {filename}: {error}')
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """ Добавить в парсер аргументов ключ замеров """
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_FILE, metavar='JSON',
+                        help=f'Замерить время и память по стадиям, записать в JSON (по умолчанию {DEFAULT_FILE})')
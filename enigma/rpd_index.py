@@ -0,0 +1,261 @@
+"""
+Индекс готовых РПД для генерации ФОС.
+
+ФОС собирается из РПД: из них берутся таблица компетенций и ЗУВ, шкалы
+оценивания, таблицы и абзацы раздела с оценочными средствами. Каждый файл
+разбирается один раз в запись RpdRecord, а записи хранятся в SQLite
+(RPD_INDEX_NAME в каталоге кэша) под полным путем файла вместе с временем
+изменения, размером и SHA-256. При следующем запуске файл разбирается заново,
+только если изменилось его содержимое: после правки одной РПД пересобирается
+одна запись. Текст читается потоково, без python-docx (см. enigma.docx_reader).
+
+Новые и измененные файлы каталога разбираются параллельно в пуле процессов
+(RpdIndex.get_all), а записи складываются в индекс в порядке имен файлов,
+так что результат не зависит от числа процессов.
+
+Без кэша индекс хранится в памяти до конца запуска.
+"""
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from . import cache, docx_reader, matcher
+from .build import hash_file
+from .grid import Grid
+
+RPD_INDEX_NAME = 'rpds.sqlite'  # см. cache.CACHE_FILES
+RPD_INDEX_VERSION = 2  # увеличивать при изменении разбора или формата записи
+RPD_MIN_CONFIDENCE = 0.85  # порог нечеткого совпадения имени РПД с дисциплиной, если файла с ее кодом нет
+
+COMPETENCE_WORDS = 'Планируемые результаты обучения по дисциплине'.split()  # заголовок таблицы компетенций
+GRADING_WORDS = ['Шкал', 'Оценк']  # заголовок последнего столбца таблицы шкал оценивания
+CONTROL_TASKS_START = 'Примерные контрольные задания (вопросы'
+CONTROL_TASKS_END = ['учебной литературы', 'iprbook', 'lanbook', 'НБ СВФУ', 'информационно-телекоммуникационной сети']
+
+
+class RpdTable(NamedTuple):
+    """ Таблица РПД: текст ячеек по строкам, перед каждым абзацем ячейки - перевод строки """
+    cells: List[str]
+    rows: int
+    columns: int
+
+
+class RpdRecord(NamedTuple):
+    """ Разобранная РПД """
+    competences: List[Tuple[str, str]]  # (компетенция, ЗУВ) из таблицы планируемых результатов
+    grading: List[Tuple[str, str]]  # (критерий, оценка) из таблиц шкал оценивания вместе с заголовками
+    tables: List[RpdTable]
+    paragraphs: List[str]  # абзацы основного текста
+    control_tasks: str  # абзацы от примерных контрольных заданий до списка литературы
+
+
+def get_table(table: docx_reader.Table) -> RpdTable:
+    """ Таблица РПД из таблицы документа """
+    return RpdTable(['\n' + text for row in table.rows for text in row], len(table.rows), table.columns)
+
+
+def get_competences(tables: List[RpdTable]) -> List[Tuple[str, str]]:
+    """ Пары (компетенция, ЗУВ) из таблиц с пятью столбцами и заголовком планируемых результатов """
+    result = []
+    for table in tables:
+        if table.columns != 5 or len(table.cells) < 4:
+            continue
+        if all(word in table.cells[3] for word in COMPETENCE_WORDS):
+            competences = table.cells[1::table.columns][1:]
+            zuv = table.cells[3::table.columns][1:]
+            result += [(competence[1:], text[1:]) for competence, text in zip(competences, zuv)]
+    return result
+
+
+def get_grading(tables: List[RpdTable]) -> List[Tuple[str, str]]:
+    """ Пары (критерий, оценка) из двух последних столбцов таблиц шкал оценивания """
+    result = []
+    for table in tables:
+        grid = Grid(table.cells, table.columns)
+        if grid.columns >= 2 and grid.has_header(GRADING_WORDS):
+            result += zip(grid.column(-2), grid.column(-1))
+    return result
+
+
+def get_control_tasks(paragraphs: List[str]) -> str:
+    """ Абзацы после заголовка примерных контрольных заданий и до списка литературы """
+    started, result = False, ''
+    for text in paragraphs:
+        if any(word in text for word in CONTROL_TASKS_END):
+            started = False
+        if started:
+            result += text + '\n'
+        if CONTROL_TASKS_START in text:
+            started = True
+    return result.replace('\n\n', '\n').replace('  ', ' ', 1000)
+
+
+def parse(filename: str) -> RpdRecord:
+    """ Разобрать файл РПД """
+    tables, paragraphs = [], []
+    for item in docx_reader.iter_items(filename):
+        if isinstance(item, docx_reader.Table):
+            tables.append(get_table(item))
+        else:
+            paragraphs.append(item)
+    return RpdRecord(get_competences(tables), get_grading(tables), tables, paragraphs, get_control_tasks(paragraphs))
+
+
+def parse_file(filename: str) -> Tuple[Optional[RpdRecord], str]:
+    """ Задание пула: разобрать файл РПД, вернуть (запись, текст ошибки); ошибка не прерывает остальные файлы """
+    try:
+        return parse(filename), ''
+    except Exception as exc:  # pylint: disable=broad-except
+        return None, f'{type(exc).__name__}: {exc}'
+
+
+def dump_record(record: RpdRecord) -> str:
+    """ Запись в JSON для индекса """
+    return json.dumps(record, ensure_ascii=False)
+
+
+def load_record(text: str) -> RpdRecord:
+    """ Запись из JSON индекса """
+    competences, grading, tables, paragraphs, control_tasks = json.loads(text)
+    return RpdRecord(
+        [tuple(pair) for pair in competences], [tuple(pair) for pair in grading],
+        [RpdTable(*table) for table in tables], paragraphs, control_tasks,
+    )
+
+
+def get_stamp(path: str) -> Tuple[int, int]:
+    """ Время изменения и размер файла """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """ Открыть базу индекса, а если это не получилось - создать индекс в памяти """
+    try:
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS rpds '
+            '(path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, hash TEXT, version INTEGER, record TEXT)'
+        )
+    except (OSError, sqlite3.Error) as error:
+        print(f'Не могу открыть индекс РПД {path}: {error}')
+        return connect(':memory:')
+    return connection
+
+
+class RpdIndex:
+    """ Записи РПД каталога rpd_dir """
+    def __init__(self, rpd_dir: str, use_cache: bool = None, cache_dir: str = None):
+        self.rpd_dir = rpd_dir
+        if use_cache is None:
+            use_cache = cache.is_enabled()
+        path = os.path.join(cache.get_cache_dir(cache_dir), RPD_INDEX_NAME) if use_cache else ':memory:'
+        self.connection = connect(path)
+        # Уже прочитанные записи: полный путь -> ((время изменения, размер), запись)
+        self.records: Dict[str, Tuple[Tuple[int, int], RpdRecord]] = {}
+        self.errors: Dict[str, str] = {}  # ошибки разбора последнего get_all: имя файла -> текст ошибки
+
+    def filenames(self) -> List[str]:
+        """ Имена файлов РПД каталога по алфавиту, без временных файлов Word """
+        return sorted(
+            filename for filename in os.listdir(self.rpd_dir)
+            if filename.endswith('.docx') and not filename.startswith('~')
+        )
+
+    def path(self, filename: str) -> str:
+        """ Путь к файлу РПД каталога """
+        return os.path.join(self.rpd_dir, filename)
+
+    def find(self, code: str, name: str, min_confidence: float = RPD_MIN_CONFIDENCE) -> Optional[str]:
+        """
+        Путь к РПД дисциплины: файл, имя которого начинается с кода code, а если такого
+        нет - ближайший по имени к «код название» (см. enigma.matcher). None - если
+        РПД нет или уверенность в совпадении меньше min_confidence
+        """
+        match = matcher.get_index(self.rpd_dir, '.docx').find(f'{code} {name}', code)
+        if match is None or match.confidence < min_confidence:
+            return None
+        return match.filename
+
+    def get(self, filename: str) -> RpdRecord:
+        """ Запись файла РПД; файл разбирается, только если его нет в индексе или он изменился """
+        key = os.path.abspath(filename)
+        stamp = get_stamp(key)
+        record = self.lookup(key, stamp)
+        if record is None:
+            record = parse(key)
+            self.add(key, stamp, record)
+        return record
+
+    def get_all(self, workers: int = None) -> Dict[str, RpdRecord]:
+        """
+        Записи всех РПД каталога: имя файла -> запись. Файлы, которых нет в индексе,
+        разбираются в workers процессах (по умолчанию по числу ядер). Файлы, которые
+        не удалось разобрать, пропускаются, а их ошибки остаются в errors
+        """
+        filenames = self.filenames()
+        stale = []
+        for filename in filenames:
+            key = os.path.abspath(self.path(filename))
+            stamp = get_stamp(key)
+            if self.lookup(key, stamp) is None:
+                stale.append((filename, key, stamp))
+
+        keys = [key for _, key, _ in stale]
+        workers = min(workers or os.cpu_count() or 1, len(stale)) if stale else 1
+        if workers == 1:
+            results = [parse_file(key) for key in keys]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(parse_file, keys))
+
+        self.errors = {}
+        for (filename, key, stamp), (record, error) in zip(stale, results):
+            if error:
+                self.errors[filename] = error
+            else:
+                self.add(key, stamp, record)
+        return {
+            filename: self.records[os.path.abspath(self.path(filename))][1]
+            for filename in filenames if filename not in self.errors
+        }
+
+    def lookup(self, key: str, stamp: Tuple[int, int]) -> Optional[RpdRecord]:
+        """ Запись файла из памяти или из базы, None - если файла нет в индексе или он изменился """
+        cached = self.records.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        row = self.connection.execute(
+            'SELECT mtime, size, hash, record FROM rpds WHERE path = ? AND version = ?', (key, RPD_INDEX_VERSION)
+        ).fetchone()
+        if row is None:
+            return None
+        if tuple(row[:2]) != stamp:
+            if row[2] != hash_file(key):
+                return None
+            # Файл перезаписан без изменений (например, скопирован заново): разбирать незачем
+            self.save(key, stamp, row[2], row[3])
+        record = load_record(row[3])
+        self.records[key] = stamp, record
+        return record
+
+    def add(self, key: str, stamp: Tuple[int, int], record: RpdRecord) -> None:
+        """ Добавить запись только что разобранного файла """
+        self.save(key, stamp, hash_file(key), dump_record(record))
+        self.records[key] = stamp, record
+
+    def save(self, key: str, stamp: Tuple[int, int], digest: str, text: str) -> None:
+        """ Записать запись файла в индекс """
+        try:
+            with self.connection:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO rpds VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, *stamp, digest, RPD_INDEX_VERSION, text),
+                )
+        except sqlite3.Error as error:
+            print(f'Не могу записать индекс РПД: {error}')
@@ -0,0 +1,96 @@
+"""
+Подготовка сканов титульных листов и литературы к вставке в РПД.
+
+Сканы обычно сняты с разрешением намного больше нужного для печати на ширину
+страницы, и сохранение документа в основном занято их сжатием. Поэтому скан
+уменьшается до ширины PRINT_WIDTH_MM при PRINT_DPI и пересжимается в JPEG.
+Результат кладется в кэш (подкаталог SCANS_KIND каталога кэша) под SHA-256
+исходного файла и параметров обработки, так что повторные запуски берут
+готовые картинки.
+
+Для обработки нужна библиотека Pillow 9.1+ (pip install pillow); без нее сканы
+вставляются как есть.
+"""
+import hashlib
+import io
+import os
+from typing import BinaryIO, Optional, Union
+
+from . import cache
+from .build import hash_file
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+PRINT_WIDTH_MM = 173  # ширина картинки в РПД
+PRINT_DPI = 300
+JPEG_QUALITY = 85
+SCANS_VERSION = 1  # увеличивать при изменении обработки
+
+SCANS_KIND = 'scans'  # см. cache.CACHE_KINDS
+SKIP_EXT = '.orig'  # отметка в кэше: обработка не уменьшила файл, вставляется исходный скан
+
+
+def get_width() -> int:
+    """ Ширина картинки в пикселях для печати """
+    return round(PRINT_WIDTH_MM / 25.4 * PRINT_DPI)
+
+
+def get_profile() -> str:
+    """ Параметры обработки: входят в ключ кэша и в манифест сборки РПД """
+    if Image is None:
+        return 'raw'
+    return f'{get_width()}px-q{JPEG_QUALITY}-v{SCANS_VERSION}'
+
+
+def process(filename: str) -> Optional[bytes]:
+    """ Уменьшить и пересжать скан; None - если файл не читается как картинка """
+    try:
+        with Image.open(filename) as image:
+            exif = image.info.get('exif')
+            if image.mode not in ('RGB', 'L'):
+                background = Image.new('RGB', image.size, 'white')
+                rgba = image.convert('RGBA')
+                background.paste(rgba, mask=rgba.getchannel('A'))
+                image = background
+            width = get_width()
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            params = {'quality': JPEG_QUALITY, 'optimize': True, 'dpi': (PRINT_DPI, PRINT_DPI)}
+            if exif:
+                params['exif'] = exif
+            image.save(output, 'JPEG', **params)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return output.getvalue()
+
+
+def prepare(filename: str, use_cache: bool = None, cache_dir: str = None) -> Union[str, BinaryIO]:
+    """
+    Что вставить в документ вместо скана filename: обработанная копия из кэша
+    (без кэша - в памяти) или сам скан, если Pillow нет, файл не картинка
+    или копия не получилась меньше
+    """
+    if Image is None:
+        return filename
+    if use_cache is None:
+        use_cache = cache.is_enabled()
+    if not use_cache:
+        data = process(filename)
+        return filename if data is None or len(data) >= os.path.getsize(filename) else io.BytesIO(data)
+
+    digest = hashlib.sha256(f'{hash_file(filename)}:{get_profile()}'.encode()).hexdigest()
+    path = os.path.join(cache.get_cache_dir(cache_dir), SCANS_KIND, digest)
+    if os.path.exists(path + '.jpg'):
+        return path + '.jpg'
+    if os.path.exists(path + SKIP_EXT):
+        return filename
+
+    data = process(filename)
+    if data is None or len(data) >= os.path.getsize(filename):
+        cache.write_file(path + SKIP_EXT, lambda output: None)
+        return filename
+    return path + '.jpg' if cache.write_file(path + '.jpg', lambda output: output.write(data)) else filename
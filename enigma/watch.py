@@ -0,0 +1,41 @@
+"""
+Слежение за изменениями входных файлов опросом: время изменения и размер
+файлов сравниваются с прошлым снимком. Сторонние библиотеки не нужны,
+и опрос одинаково работает в Windows, Linux и на сетевых дисках.
+"""
+import fnmatch
+import os
+from typing import Dict, Iterable, Set, Tuple
+
+WATCH_INTERVAL = 0.2  # период опроса, с
+
+Snapshot = Dict[str, Tuple[int, int]]  # полный путь -> (время изменения, размер)
+
+
+def snapshot(paths: Iterable[str], pattern: str = '*') -> Snapshot:
+    """
+    Снимок файлов: каталоги раскрываются в файлы по шаблону имени (без вложенных
+    каталогов и скрытых файлов), несуществующие пути пропускаются
+    """
+    result = {}
+    for path in paths:
+        path = os.path.abspath(path)
+        try:
+            if not os.path.isdir(path):
+                stat = os.stat(path)
+                result[path] = stat.st_mtime_ns, stat.st_size
+                continue
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or not fnmatch.fnmatch(entry.name, pattern) or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    result[entry.path] = stat.st_mtime_ns, stat.st_size
+        except OSError:
+            continue
+    return result
+
+
+def get_changes(old: Snapshot, new: Snapshot) -> Set[str]:
+    """ Добавленные, удаленные и измененные файлы """
+    return {path for path in old.keys() | new.keys() if old.get(path) != new.get(path)}
@@ -1,31 +1,110 @@
 """
 Функции работы с документами
 """
+import copy
+import os
 import sys
 from os.path import join
+from typing import Dict, Tuple
 
+from docx import Document
+from docx.document import Document as DocumentType
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.part import Part, XmlPart
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
-from docx.table import Table
+from docx.package import Package
+from docx.table import Table, _Row
 from docxtpl import DocxTemplate
 
 CENTER = 'Table Heading'
 JUSTIFY = 'Table Contents'
 
+TEMPLATES_DIR = 'templates'
+
+# Части, которые docxtpl меняет при отрисовке: свойства документа (render_properties),
+# сноски (render_footnotes), колонтитулы и картинки в них (replace_pic)
+CLONED_RELTYPES = {RT.CORE_PROPERTIES, RT.FOOTNOTES, RT.HEADER, RT.FOOTER, RT.IMAGE}
+
+# Разобранные шаблоны: полный путь -> (время изменения файла, документ-прототип).
+# Прототип не изменяется, каждый get_template получает его копию
+_prototypes: Dict[str, Tuple[float, DocumentType]] = {}
+
 
 def get_template(filename: str) -> DocxTemplate:
-    """ Читаем шаблон РПД """
+    """ Читаем шаблон РПД: файл разбирается один раз, дальше выдаются копии прототипа """
+    path = join(TEMPLATES_DIR, filename)
     try:
-        template = DocxTemplate(join('templates', filename))
+        prototype = get_prototype(path)
     except OSError:
         print('Не могу открыть шаблон')
         sys.exit()
+    template = DocxTemplate(path)
+    template.docx = clone_document(prototype)
     return template
 
 
+def get_prototype(path: str) -> DocumentType:
+    """ Прототип документа из кэша; если файл шаблона изменился, он читается заново """
+    key = os.path.abspath(path)
+    mtime = os.path.getmtime(key)
+    cached = _prototypes.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = mtime, Document(key)
+        _prototypes[key] = cached
+    return cached[1]
+
+
+def clone_document(prototype: DocumentType) -> DocumentType:
+    """
+    Копия документа для заполнения. Копируются XML основной части, связи пакета и
+    части, которые docxtpl меняет при отрисовке (CLONED_RELTYPES); стили, нумерация,
+    тема и прочие части остаются общими с прототипом
+    """
+    proto_part = prototype.part
+    package = Package()
+    clones = {}
+    part = clone_part(proto_part, package, clones)
+    for rel in proto_part.package.rels.values():
+        target = rel._target  # pylint: disable=protected-access
+        if not rel.is_external and (target is proto_part or rel.reltype in CLONED_RELTYPES):
+            target = clone_part(target, package, clones)
+        package.load_rel(rel.reltype, target, rel.rId, rel.is_external)
+
+    # Новые картинки должны получать имена, не занятые картинками шаблона
+    package.after_unmarshal()
+    return part.document
+
+
+def clone_part(part: Part, package: Package, clones: Dict[Part, Part]) -> Part:
+    """
+    Копия части в пакете package. XML копируется, у двоичных частей общие байты
+    (docxtpl их не меняет, а подменяет). Части по связям с типами CLONED_RELTYPES
+    тоже копируются, остальные связи ведут в части прототипа. clones - уже
+    скопированные части
+    """
+    clone = clones.get(part)
+    if clone is not None:
+        return clone
+    if isinstance(part, XmlPart):
+        clone = type(part)(part.partname, part.content_type, copy.deepcopy(part.element), package)
+    else:
+        clone = type(part).load(part.partname, part.content_type, part.blob, package)
+    clones[part] = clone
+    for rel in part.rels.values():
+        target = rel._target  # pylint: disable=protected-access
+        if not rel.is_external and rel.reltype in CLONED_RELTYPES:
+            target = clone_part(target, package, clones)
+        clone.load_rel(rel.reltype, target, rel.rId, rel.is_external)
+    return clone
+
+
 def set_cell_text(table: Table, row: int, col: int, style: str, text: str) -> None:
-    """ Добавить текст в ячейку таблицы """
-    cell = table.cell(row, col)
+    """
+    Добавить текст в ячейку таблицы. Ячейка ищется только в своей строке:
+    Table.cell() строит сетку всей таблицы при каждом вызове
+    """
+    cell = _Row(table._tbl.tr_lst[row], table).cells[col]  # pylint: disable=protected-access
     if cell.text:
         cell.add_paragraph(text, style)
     else:
@@ -33,8 +112,12 @@ def set_cell_text(table: Table, row: int, col: int, style: str, text: str) -> No
         cell.paragraphs[0].style = style
 
 
-def add_table_rows(table: Table, rows: int) -> None:
-    """ Добавить строки в таблицу """
+def add_table_rows(table: Table, rows: int) -> int:
+    """
+    Добавить строки в конец таблицы, возвращает индекс первой добавленной строки.
+    Строка с рамками собирается один раз, остальные - ее копии, которые
+    вставляются в XML таблицы одной операцией
+    """
     def get_border(name):
         border = OxmlElement(f'w:{name}')
         border.set(qn('w:val'), 'single')
@@ -49,11 +132,21 @@ def add_table_rows(table: Table, rows: int) -> None:
         borders.append(get_border('right'))
         return borders
 
-    for _ in range(rows):
-        row = table.add_row()
-        for cell in row.cells:
-            props = cell._element.tcPr  # pylint: disable=protected-access
-            props.append(get_borders())
+    tbl = table._tbl  # pylint: disable=protected-access
+    first_row = len(tbl.tr_lst)
+    if rows <= 0:
+        return first_row
+
+    # Первая строка - как у Table.add_row(): по ячейке на колонку сетки с ее шириной
+    prototype = tbl.add_tr()
+    for grid_col in tbl.tblGrid.gridCol_lst:
+        cell = prototype.add_tc()
+        if grid_col.w is not None:
+            cell.width = grid_col.w
+        cell.get_or_add_tcPr().append(get_borders())
+
+    tbl.extend(copy.deepcopy(prototype) for _ in range(rows - 1))
+    return first_row
 
 
 def remove_table(template: DocxTemplate, table_index: int) -> None:
@@ -3,44 +3,39 @@
 """
 import os
 
-from docx import Document
+from enigma import docx_reader
 
 
-def findout_fos(documento):
-    """ Извлекаем текст раздела "Фонд оценочных средств" из РПД """
+def findout_fos(paragraphs):
+    """ Извлекаем текст раздела "Фонд оценочных средств" из абзацев РПД """
     text_at_start = ['Фонд оценочных средств']
     text_at_end = ['учебной литературы', 'iprbook', 'lanbook', 'НБ СВФУ',
                    'информационно-телекоммуникационной сети']
     flag, result_text = False, ''
-    for paragraph in documento.paragraphs:
-        if text_at_start[0] in paragraph.text:
+    for text in paragraphs:
+        if text_at_start[0] in text:
             flag = True
-        if any(key_word in paragraph.text for key_word in text_at_end):
+        if any(key_word in text for key_word in text_at_end):
             flag = False
         if flag:
-            result_text += (paragraph.text + '\n')
+            result_text += (text + '\n')
     result_text = result_text.replace('\n\n', '\n').replace('  ', ' ', 1000)
     return result_text
 
 
-def findout_fos_table(documento):
-    """ Извлекаем результаты обучения (ЗУВы) по дисциплине из РПД """
+def findout_fos_table(tables):
+    """ Извлекаем результаты обучения (ЗУВы) по дисциплине из таблиц РПД """
     text_in_table = ['Коды оцениваемых компетенций', 'Показатель оценивания',
                      'Шкалы оценивания', 'Уровни освоения', 'Критерии оценивания',
                      'оцениваемых компетенций', 'показатель оценивания',
                      'шкалы оценивания', 'уровни освоения', 'критерии оценивания',
                      'тлично', 'хорошо', 'удовл', 'зачтено']
     tablez = ''
-    for table in documento.tables:
+    for table in tables:
         flag, tablelist = False, []
         max_col_num = 0
         for row in table.rows:
-            rowlist = []
-            for cell in row.cells:
-                celltext = ''
-                for paragraph in cell.paragraphs:
-                    celltext += ('\n' + paragraph.text)
-                rowlist.append(celltext)
+            rowlist = ['\n' + celltext for celltext in row]
             if len(rowlist) > max_col_num:
                 max_col_num = len(rowlist)
             if rowlist:
@@ -64,11 +59,14 @@ def findout_fos_table(documento):
 
 for filename in os.listdir():
     if filename.endswith(".docx"):
-        f = open(filename, 'rb')
-        document = Document(f)
-        got_fos = findout_fos_table(document) + findout_fos(document)
-        f.close()
+        paragraphs, tables = [], []
+        for item in docx_reader.iter_items(filename):
+            if isinstance(item, docx_reader.Table):
+                tables.append(item)
+            else:
+                paragraphs.append(item)
+        got_fos = findout_fos_table(tables) + findout_fos(paragraphs)
         f2 = open(filename[:-4] + 'txt', "w+")
         f2.write(got_fos)
         print(filename)
-        print(findout_fos_table(document))
+        print(findout_fos_table(tables))
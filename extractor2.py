@@ -1,79 +1,29 @@
 """ Генерация ФОС """
-import difflib
-import os
-import sys
-from typing import Any, Dict, List
-
-import numpy as np
-import pandas as pd
-from docx import Document
-from docx.document import Document as DocumentType
+from argparse import ArgumentParser, Namespace
+from typing import Dict, List, NamedTuple, Tuple
+
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml import CT_P, CT_Tbl
-from docx.table import Table, _Cell
-from docx.text.paragraph import Paragraph
+from docx.table import Table
 from docxtpl import DocxTemplate
 
 import core
-from enigma import Competence, EducationPlan, Subject, get_plan, word_doc
+from enigma import Competence, EducationPlan, Subject, cache, docx_reader, get_plan, profiling, word_doc
 from enigma.education_plan import CT_EXAM, CT_COURSEWORK, CT_CREDIT, CT_CREDIT_GRADE
+from enigma.grid import Grid
+from enigma.rpd_index import RpdIndex, RpdRecord
 from enigma.word_doc import add_table_rows, set_cell_text
 
 
-def iterate_items(parent: Any):
-    """ Обход параграфов и таблиц в документе """
-    if isinstance(parent, DocumentType):
-        parent_elem = parent.element.body
-    elif isinstance(parent, _Cell):
-        parent_elem = parent._tc
-    else:
-        raise ValueError('Oops')
-
-    for child in parent_elem.iterchildren():
-        if isinstance(child, CT_P):
-            yield Paragraph(child, parent)
-        elif isinstance(child, CT_Tbl):
-            yield Table(child, parent)
-
-
 def get_section_paragraphs(input_filename: str, start_kw: List[str], final_kw: List[str]) -> List[str]:
     """ Извлечь список абзацев текста из docx-файла """
-    result, source = Document(), Document(input_filename)
-    started = False
     paragraphs = []
-    for item in iterate_items(source):
-        if not started:
-            if isinstance(item, Paragraph) and any(kw in item.text for kw in start_kw):
-                started = True
-        else:
-            if isinstance(item, Paragraph) and any(kw in item.text for kw in final_kw):
-                break
-            if isinstance(item, Paragraph):
-                text = item.text.strip()
-                if text:
-                    paragraphs.append(text + '\n')
-            elif isinstance(item, Table):
-                pass
+    for text in docx_reader.get_section(input_filename, start_kw, final_kw):
+        text = text.strip()
+        if text:
+            paragraphs.append(text + '\n')
     return paragraphs
 
 
-def get_rpd(name):
-    result = None
-    for fn in os.listdir('rpds'):
-        if fn.endswith('.docx'):
-            if name in fn:
-                result = os.path.join('rpds', fn)
-                break
-    return result
-
-
-def check_args() -> None:
-    """ Проверка аргументов командной строки """
-    if len(sys.argv) != 3:
-        print('Синтаксис:\n\tpython {0} <руп> <фос>'.format(*sys.argv))
-        sys.exit()
-
-
 def fill_table_1(template: DocxTemplate, context: Dict[str, any]) -> None:
     """ Заполнение таблиц с формами контроля """
     control_fancy_name = {
@@ -90,18 +40,18 @@ def fill_table_1(template: DocxTemplate, context: Dict[str, any]) -> None:
         word_doc.remove_table(template, 2)
     table: Table = template.get_docx().tables[1]
 
+    competences = sorted(plan.competence_codes.values(), key=Competence.repr)
+    row = add_table_rows(table, sum(1 + len(competence.subjects) for competence in competences)) - 1
     row_number = 0
-    for competence in sorted(plan.competence_codes.values(), key=Competence.repr):
-        add_table_rows(table, 1)
-        row = len(table.rows) - 1
+    for competence in competences:
+        row += 1
         row_number += 1
         set_cell_text(table, row, 0, word_doc.CENTER, str(row_number))
         set_cell_text(table, row, 1, word_doc.JUSTIFY, competence.code + ' ' + competence.description)
         table.cell(row, 1).merge(table.cell(row, len(table.columns) - 1))
         subjects = [plan.subject_codes[s] for s in competence.subjects]
         for subject in sorted(subjects, key=Subject.repr):
-            add_table_rows(table, 1)
-            row = len(table.rows) - 1
+            row += 1
             row_number += 1
             set_cell_text(table, row, 0, word_doc.CENTER, str(row_number))
             set_cell_text(table, row, 1, word_doc.JUSTIFY, subject.code + ' ' + subject.name)
@@ -110,21 +60,6 @@ def fill_table_1(template: DocxTemplate, context: Dict[str, any]) -> None:
                 set_cell_text(table, row, number+1, word_doc.CENTER, ', '.join(controls))
 
 
-def table2list(x):
-    """ Читает таблицу из РПД в список """
-    ls = []
-    try:
-        for row in x.rows:
-            for cell in row.cells:
-                celltext = ''
-                for paragraph in cell.paragraphs:
-                    celltext += '\n' + paragraph.text
-                ls.append(celltext)
-        return [ls, len(x.rows), len(x.columns)]
-    except IndexError:
-        return [[' '], 1, 1]
-
-
 cases = {
     'отл': 'Отлично',
     'хор': 'Хорошо',
@@ -155,61 +90,48 @@ def normalize(alist):
     return thelist
 
 
-def findout_fos_part(documento):
-    """ Выдергивает все абзацы между литературой и "Примерные контрольные задания" """
-    text_at_start = ['Примерные контрольные задания (вопросы']
-    text_at_end = ['учебной литературы', 'iprbook', 'lanbook', 'НБ СВФУ',
-                   'информационно-телекоммуникационной сети']
-    flag, result_text = False, ''
-    for paragraph in documento.paragraphs:
-        if any(key_word in paragraph.text for key_word in text_at_end):
-            flag = False
-        if flag:
-            result_text += (paragraph.text+'\n')
-        if text_at_start[0] in paragraph.text:
-            flag = True
-    result_text = result_text.replace('\n\n', '\n').replace('  ', ' ', 1000)
-    return result_text
-
-
-def find_rpd(subjectcode, subjectname, control, controls, sem):
-    global fileslist
-    filename = difflib.get_close_matches(subjectcode + ' ' + subjectname, fileslist)
-    if len(filename) < 1:
-        return [' ', ' ', ' ', ' ', ' ', ' ']
-    filename = './rpds/' + str(filename[0]) + '.docx'
-    rpd_doc = Document(filename)
-    marks = []
-    crirs = []
+class RpdCriteria(NamedTuple):
+    """ Данные РПД для таблицы 2 ФОС, которые не зависят от формы контроля """
+    zuv: str  # оцениваемый показатель (ЗУВ)
+    marks: List[str]  # оценки строк шкал оценивания после normalize
+    criteria: List[str]  # критерии тех же строк
+    fos_text: str  # раздел с контрольными заданиями в нижнем регистре
+
+
+# Разобранные РПД за время запуска: путь -> (запись индекса, данные). Одна дисциплина
+# входит в таблицу 2 по разу на каждую компетенцию и форму контроля
+rpd_criteria: Dict[str, Tuple[RpdRecord, RpdCriteria]] = {}
+
+
+def get_criteria(index: RpdIndex, filename: str) -> RpdCriteria:
+    """ ЗУВ, критерии оценивания и раздел контрольных заданий РПД; повторно для того же файла не вычисляются """
+    record = index.get(filename)
+    cached = rpd_criteria.get(filename)
+    if cached is not None and cached[0] is record:
+        return cached[1]
+
+    crirs = [criterion for criterion, _ in record.grading]
+    marks = [mark for _, mark in record.grading]
     zuv = ' '   
     zuv_not_found, zuv_not_found2 = True, True
-    for table in rpd_doc.tables:
-        tablen = table2list(table)
-        row, column = tablen[1], tablen[2]
-        tablen = tablen[0]
-        if len(tablen) < column:
+    for table in record.tables:
+        grid = Grid(table.cells, table.columns)
+        if grid.rows == 0:
             continue
-        else: 
-            row = len(tablen) // column
-            tablen = tablen[:(row*column)]
-        df = pd.DataFrame(np.array(tablen).reshape(row, column))  # reshape to the table shape
-
-        if sum([key_word in df.iloc[0, column-1] for key_word in ['Шкал', 'Оценк']]) > 0:
-            marks += list(df[df.columns[-1]])
-            crirs += list(df[df.columns[-2]])
+
         try:
             if zuv_not_found:
                 for irow in range(3, 0, -1):
                     for icol in range(1, 3):
-                        if '(ЗУВ)' in df.iloc[irow, icol]:
-                            zuv += df.iloc[irow + 1, icol]
+                        if '(ЗУВ)' in grid.cell(irow, icol):
+                            zuv += grid.cell(irow + 1, icol)
                             zuv_not_found = False
 
             if zuv_not_found2 and zuv_not_found:
                 for irow in range(3, 0, -1):
                     for icol in range(1, 3):
-                        if '.1.2.' in df.iloc[irow, icol]:
-                            zuv += df.iloc[irow+1, icol]
+                        if '.1.2.' in grid.cell(irow, icol):
+                            zuv += grid.cell(irow + 1, icol)
                             zuv_not_found2 = False
         except IndexError: 
             cndekc = 7
@@ -217,6 +139,17 @@ def find_rpd(subjectcode, subjectname, control, controls, sem):
     marks = normalize(marks)
     crirs = [x for ind, x in enumerate(crirs) if marks[ind] != ' ']
     marks = [x for x in marks if x != ' ']
+    result = RpdCriteria(zuv.replace('\n\n', '\n'), marks, crirs, record.control_tasks.lower())
+    rpd_criteria[filename] = record, result
+    return result
+
+
+def find_rpd(index: RpdIndex, subjectcode, subjectname, control, controls, sem):
+    filename = index.find(subjectcode, subjectname)
+    if filename is None:
+        return [' ', ' ', ' ', ' ', ' ', ' ']
+    rpd = get_criteria(index, filename)
+    marks, crirs = rpd.marks, rpd.criteria
     excellent, good, fair, bad, tests = ' ', ' ', ' ', ' ', ' ' 
     if control == 'Зачет':
         for ind, criteria in enumerate(crirs):
@@ -230,21 +163,18 @@ def find_rpd(subjectcode, subjectname, control, controls, sem):
             if marks[ind] == 'не Удов': bad += crirs[ind]
     
     if bad == ' ': bad = excellent
-    document = Document(filename)
-    bigtext = findout_fos_part(document) 
-    bigtext = (control + bigtext).lower()
+    bigtext = control.lower() + rpd.fos_text
     testtype = ' '
     for key, value in testtypes.items():
         if key in bigtext:
             testtype = value
             continue
 
-    return [zuv.replace('\n\n', '\n'), excellent, good, fair, bad, testtype]
+    return [rpd.zuv, excellent, good, fair, bad, testtype]
  
 
 def fill_table_2(template: DocxTemplate, context: Dict[str, any]) -> None:
     """ Заполнение таблиц с формами контроля """
-    global fileslist 
     control_fancy_name = {
         CT_EXAM: 'Экзамен',
         CT_CREDIT_GRADE: 'Зачет с оценкой',
@@ -253,34 +183,37 @@ def fill_table_2(template: DocxTemplate, context: Dict[str, any]) -> None:
     }
 
     plan: EducationPlan = context['plan']
+    index: RpdIndex = context['rpd_index']
     table: Table = template.get_docx().tables[2]
-    fileslist = [filename[:-5] for filename in os.listdir('./rpds') if filename.endswith('.docx')]
 
-    row_number = 0
+    # Формы контроля дисциплин известны заранее: все строки таблицы добавляем сразу
+    competence_subjects = []
     for competence in sorted(plan.competence_codes.values(), key=Competence.repr):
-        add_table_rows(table, 1)
-        row = len(table.rows) - 1
+        subjects = []
+        for subject in sorted((plan.subject_codes[s] for s in competence.subjects), key=Subject.repr):
+            controls = []
+            for number, semester in subject.semesters.items():
+                controls += [control_fancy_name[c] for c in semester.control]
+            subjects.append((subject, controls))
+        competence_subjects.append((competence, subjects))
+    rows_count = sum(1 + sum(len(controls) for _, controls in subjects) for _, subjects in competence_subjects)
+    row = add_table_rows(table, rows_count) - 1
+
+    row_number = 0
+    for competence, subjects in competence_subjects:
+        row += 1
         row_number += 1
         set_cell_text(table, row, 0, word_doc.CENTER, str(row_number))
         set_cell_text(table, row, 1, word_doc.JUSTIFY, competence.code + ' ' + competence.description)
         for runover in range(2, 8):
             set_cell_text(table, row, runover, word_doc.JUSTIFY, ' ')
         # table.cell(row, 1).merge(table.cell(row, len(table.columns) - 1))
-        subjects = [plan.subject_codes[s] for s in competence.subjects]
-        for subject in sorted(subjects, key=Subject.repr):
-            # add_table_rows(table, 1)
-            # row = len(table.rows) - 1
-            # len(table.rows) - 1
-            # row_number += 1
-            controls = []
-            for number, semester in subject.semesters.items():
-                controls += [control_fancy_name[c] for c in semester.control]
-             
+        for subject, controls in subjects:
             sem = 0
-            for control in controls: 
-                add_table_rows(table, 1)
-                row = len(table.rows) - 1             
-                zuv_criteria = find_rpd(subject.code, subject.name, control, controls, sem)
+            for control in controls:
+                row += 1
+                with profiling.stage('find_rpd'):
+                    zuv_criteria = find_rpd(index, subject.code, subject.name, control, controls, sem)
                 sem += 1
                 if len(zuv_criteria) == 6:
                     set_cell_text(table, row, 0, word_doc.CENTER, ' ')
@@ -304,9 +237,10 @@ def fill_table_2_1(template: DocxTemplate, context: Dict[str, any]) -> None:
     """ Заполнение таблицы в разделе 2.1 """
     plan: EducationPlan = context['plan']
     table: Table = template.get_docx().tables[3]
-    for subject in sorted(plan.subject_codes.values(), key=Subject.repr):
-        add_table_rows(table, 1)
-        row_index = len(table.rows) - 1
+    subjects = sorted(plan.subject_codes.values(), key=Subject.repr)
+    row_index = add_table_rows(table, len(subjects)) - 1
+    for subject in subjects:
+        row_index += 1
         set_cell_text(table, row_index, 0, word_doc.CENTER, subject.code)
         set_cell_text(table, row_index, 1, word_doc.JUSTIFY, subject.name)
 
@@ -386,47 +320,31 @@ def preceding_paragraph(fos_doc, x):
     return table_flazhok
 
 
-def findout_fos(documento):
-    """ Выдергивает все абзацы между литературой и "Примерные контрольные задания" """
-    text_at_start = ['Примерные контрольные задания (вопросы']
-    text_at_end = ['учебной литературы', 'iprbook', 'lanbook', 'НБ СВФУ', 'информационно-телекоммуникационной сети']
-    flag, result_text = False, ''
-    for paragraph in documento.paragraphs:
-        if any(key_word in paragraph.text for key_word in text_at_end):
-            flag = False
-        if flag:
-            result_text += (paragraph.text + '\n')
-        if text_at_start[0] in paragraph.text:
-            flag = True
-    result_text = result_text.replace('\n\n', '\n').replace('  ', ' ', 1000)
-    return result_text
-
-
 def list2docx(fos_doc, ls, row, column):
     """ Из списка восстанавливает таблицу, объединяя ячейки со совпадающими текстами """
     if len(ls) != row * column:
         return 
 
-    df = pd.DataFrame(np.array(ls).reshape(row, column))  # reshape to the table shape
+    grid = Grid(ls, column)
     word_table = fos_doc.add_table(rows=row, cols=column, style='Table Grid')
     for ind_row in range(0, row, 1):
         for ind_col in range(0, column, 1):
             cell = word_table.cell(ind_row, ind_col)
             if ind_row > 0:
                 cell2 = word_table.cell(ind_row-1, ind_col)
-                if cell2.text == df.iloc[ind_row, ind_col]:
+                if cell2.text == grid.cell(ind_row, ind_col):
                     cell.text = ''
                     cell.merge(cell2)
                 else:
-                    cell.text = df.iloc[ind_row, ind_col]
+                    cell.text = grid.cell(ind_row, ind_col)
             else:
                 if ind_col > 0:
                     cell2 = word_table.cell(ind_row, ind_col-1)
-                    if cell2.text == df.iloc[ind_row, ind_col]:
+                    if cell2.text == grid.cell(ind_row, ind_col):
                         cell.text = ''
                         cell.merge(cell2)
                     else:
-                        cell.text = df.iloc[ind_row, ind_col]
+                        cell.text = grid.cell(ind_row, ind_col)
     fos_doc.add_paragraph(' ')                                      
     return 
 
@@ -447,8 +365,7 @@ def fill_section_2_2(template: DocxTemplate, context: Dict[str, any]) -> None:
     #     if all(kw in p1.text.lower() for kw in keywords):
     #         marker = p1
     #         break
-    global fileslist
-    fileslist = [filename[:-5] for filename in os.listdir('./rpds') if filename[-4:] == 'docx']
+    index: RpdIndex = context['rpd_index']
 
     plan: EducationPlan = context['plan']
     middle[1] += 'магистратуры' if plan.degree == core.MASTER else 'бакалавриата'
@@ -456,11 +373,10 @@ def fill_section_2_2(template: DocxTemplate, context: Dict[str, any]) -> None:
     middle[3] = plan.code + ' ' + plan.name
     subjects = sorted(plan.subject_codes.values(), key=Subject.repr)
     for s in subjects:
-        rpd = difflib.get_close_matches(s.code + ' ' + s.name, fileslist)
-        if len(rpd) < 1:
+        rpd = index.find(s.code, s.name)
+        if rpd is None:
             continue
-        rpd = './rpds/' + str(rpd[0]) + '.docx'
-        rpd_doc = Document(rpd)
+        record = index.get(rpd)
 
         # титульная страница
         document = template.get_docx()
@@ -482,12 +398,11 @@ def fill_section_2_2(template: DocxTemplate, context: Dict[str, any]) -> None:
 
         ''' флажок, чтобы забрать все таблицы между двумя группами ключевых слов '''
         table_flazhok = False
-        for table in rpd_doc.tables:
-            tablen = table2list(table)
-            if preceding_paragraph(document, ' '.join(tablen[0][:6])):
+        for tablen in record.tables:
+            if preceding_paragraph(document, ' '.join(tablen.cells[:6])):
                 list2docx(document, *tablen)
         ''' таблицы все включены, теперь забираем все абзацы '''
-        text_heap = findout_fos(rpd_doc)
+        text_heap = record.control_tasks
         document.add_paragraph(text_heap) 
         if 'Методические материалы, определяющие' not in text_heap:
             document.add_paragraph('\n'.join(method_mater))
@@ -517,54 +432,64 @@ def fill_table_4(template: DocxTemplate, context: Dict[str, any]) -> None:
     """ Заполнение бланка "Лист сформированности компетенций" """
     plan: EducationPlan = context['plan']
     table: Table = template.get_docx().tables[-1]
+    competences = sorted(plan.competence_codes.values(), key=Competence.repr)
+    rows_count = sum(1 + len(competence.subjects) for competence in competences) + 2  # и еще практики и НИР
+    row_index = add_table_rows(table, rows_count) - 1
     row_number = 0
-    for competence in sorted(plan.competence_codes.values(), key=Competence.repr):
-        add_table_rows(table, 1)
-        row_index = len(table.rows) - 1
+    for competence in competences:
+        row_index += 1
         row_number += 1
         set_cell_text(table, row_index, 0, word_doc.CENTER, str(row_number))
         set_cell_text(table, row_index, 1, word_doc.JUSTIFY, competence.code + ' ' + competence.description)
         subjects = [plan.subject_codes[s] for s in competence.subjects]
         for subject in sorted(subjects, key=Subject.repr):
-            add_table_rows(table, 1)
-            row_index = len(table.rows) - 1
+            row_index += 1
             set_cell_text(table, row_index, 1, word_doc.JUSTIFY, subject.code + ' ' + subject.name)
 
-    add_table_rows(table, 1)
+    row_index += 1
     row_number += 1
-    row_index = len(table.rows) - 1
     set_cell_text(table, row_index, 0, word_doc.CENTER, str(row_number))
     set_cell_text(table, row_index, 1, word_doc.JUSTIFY, 'Практики')
 
-    add_table_rows(table, 1)
+    row_index += 1
     row_number += 1
-    row_index = len(table.rows) - 1
     set_cell_text(table, row_index, 0, word_doc.CENTER, str(row_number))
     set_cell_text(table, row_index, 1, word_doc.JUSTIFY, 'НИР')
 
 
-def main() -> None:
+def main(args: Namespace) -> None:
     """ Точка входа """
-    check_args()
-    global fileslist
-
-    plan = get_plan(sys.argv[1])
-    template = word_doc.get_template('fos.docx')
+    with profiling.stage('plan'):
+        plan = get_plan(args.plan, not args.no_cache, args.cache_dir).load()
+    with profiling.stage('template'):
+        template = word_doc.get_template('fos.docx')
     context = {
         'plan': plan,
+        'rpd_index': RpdIndex(args.rpd_dir, not args.no_cache, args.cache_dir),
     }
-    fill_table_1(template, context)
-    fileslist = ' '
-    fill_table_2(template, context)
-    fill_table_2_1(template, context)
-    fill_table_4(template, context)
-    fill_section_2_2(template, context)
-    template.render(context)
-    template.save('filled_'+sys.argv[2])
+    fills = (fill_table_1, fill_table_2, fill_table_2_1, fill_table_4, fill_section_2_2)
+    for fill in fills:
+        with profiling.stage(fill.__name__):
+            fill(template, context)
+    with profiling.stage('render'):
+        template.render(context)
+    with profiling.stage('save'):
+        template.save('filled_' + args.fos)
     print('Partially done')
 
 
 if __name__ == '__main__':
     table_flazhok = False
-    fileslist = ' '
-    main()
+    parser = ArgumentParser()
+    parser.add_argument('plan', help='PLX-файл РУПа')
+    parser.add_argument('fos', help='Имя файла ФОС, результат сохраняется в filled_<фос>')
+    parser.add_argument('--rpd-dir', default='rpds', help='Каталог РПД (по умолчанию rpds)')
+    cache.add_arguments(parser)
+    profiling.add_arguments(parser)
+    arguments = parser.parse_args()
+    if arguments.profile:
+        profiling.start()
+    try:
+        main(arguments)
+    finally:
+        profiling.report(arguments.profile)
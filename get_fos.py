@@ -1,70 +1,28 @@
 """ Генерация ФОС """
-import os
 from argparse import ArgumentParser, Namespace
 from typing import Dict, List
 
-from docx import Document
-from docx.document import Document as DocumentType
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml import CT_P, CT_Tbl
 from docx.shared import Cm
-from docx.table import Table, _Cell
-from docx.text.paragraph import Paragraph
+from docx.table import Table
 from docxtpl import DocxTemplate
 
 import core
-from enigma import Competence, EducationPlan, Subject, get_plan, word_doc
+from enigma import Competence, EducationPlan, Subject, cache, docx_reader, get_plan, profiling, word_doc
+from enigma.rpd_index import RpdIndex
 from enigma.word_doc import add_table_rows, set_cell_text
 
 
-def iterate_items(parent):
-    """ Обход параграфов и таблиц в документе """
-    if isinstance(parent, DocumentType):
-        parent_elem = parent.element.body
-    elif isinstance(parent, _Cell):
-        parent_elem = parent._tc  # pylint: disable=protected-access
-    else:
-        raise ValueError('Oops')
-
-    for child in parent_elem.iterchildren():
-        if isinstance(child, CT_P):
-            yield Paragraph(child, parent)
-        elif isinstance(child, CT_Tbl):
-            yield Table(child, parent)
-
-
 def get_section_paragraphs(input_filename: str, start_kw: List[str], final_kw: List[str]) -> List[str]:
     """ Извлечь список абзацев текста из docx-файла """
-    source = Document(input_filename)
-    started = False
     paragraphs = []
-    for item in iterate_items(source):
-        if not started:
-            if isinstance(item, Paragraph) and any(kw in item.text for kw in start_kw):
-                started = True
-        else:
-            if isinstance(item, Paragraph) and any(kw in item.text for kw in final_kw):
-                break
-            if isinstance(item, Paragraph):
-                text = item.text.strip()
-                if text:
-                    paragraphs.append(text + '\n')
-            elif isinstance(item, Table):
-                pass
+    for text in docx_reader.get_section(input_filename, start_kw, final_kw):
+        text = text.strip()
+        if text:
+            paragraphs.append(text + '\n')
     return paragraphs
 
 
-def get_rpd(name):
-    """ Получить список имен файлов РПД """
-    result, base_dir = None, 'rpds'
-    for file_name in os.listdir(base_dir):
-        if file_name.endswith('.docx'):
-            if name in file_name:
-                result = os.path.join(base_dir, file_name)
-                break
-    return result
-
-
 def fill_table_1(template: DocxTemplate, context: Dict[str, any]) -> None:
     """ Заполнение таблиц с формами контроля """
     # control_fancy_name = {
@@ -81,10 +39,11 @@ def fill_table_1(template: DocxTemplate, context: Dict[str, any]) -> None:
         word_doc.remove_table(template, 2)
     table: Table = template.get_docx().tables[1]
 
+    competences = sorted(plan.competence_codes.values(), key=Competence.repr)
+    row = add_table_rows(table, len(competences)) - 1
     row_number = 0
-    for competence in sorted(plan.competence_codes.values(), key=Competence.repr):
-        add_table_rows(table, 1)
-        row = len(table.rows) - 1
+    for competence in competences:
+        row += 1
         row_number += 1
         set_cell_text(table, row, 0, word_doc.CENTER, str(row_number))
         set_cell_text(table, row, 1, word_doc.JUSTIFY, competence.code + ' ' + competence.description)
@@ -105,28 +64,28 @@ def fill_table_1(template: DocxTemplate, context: Dict[str, any]) -> None:
 
     rpd_dict = context['rpd_dict']
     table: Table = template.get_docx().tables[2]
+    competence_subjects = [
+        (competence, [plan.subject_codes[s] for s in competence.subjects if s.startswith('Б1')])
+        for competence in competences
+    ]
+    row = add_table_rows(table, sum(1 + len(subjects) for _, subjects in competence_subjects)) - 1
     row_number1 = 0
-    for competence in sorted(plan.competence_codes.values(), key=Competence.repr):
-        add_table_rows(table, 1)
-        row = len(table.rows) - 1
+    for competence, subjects in competence_subjects:
+        row += 1
         row_number1 += 1
         set_cell_text(table, row, 0, word_doc.CENTER, str(row_number1))
         set_cell_text(table, row, 1, word_doc.JUSTIFY, competence.code + ' ' + competence.description)
         values = ['%s %s' % (k, v.description) for k, v in competence.indicator_codes.items()]
         set_cell_text(table, row, 2, word_doc.JUSTIFY, '\n'.join(values))
         row_number2 = 0
-        subjects = [plan.subject_codes[s] for s in competence.subjects]
         for subject in subjects:
-            if not subject.code.startswith('Б1'):
-                continue
             zuv_raw = ''
             rpd = rpd_dict.get(subject.code)
             if rpd:
                 zuv = rpd.competences.get(competence.code)
                 if zuv:
                     zuv_raw = zuv.raw
-            add_table_rows(table, 1)
-            row = len(table.rows) - 1
+            row += 1
             row_number2 += 1
             set_cell_text(table, row, 0, word_doc.CENTER, '%d.%d' % (row_number1, row_number2))
             set_cell_text(table, row, 1, word_doc.JUSTIFY, subject.code + ' ' + subject.name)
@@ -140,9 +99,10 @@ def fill_table_2_1(template: DocxTemplate, context: Dict[str, any]) -> None:
     """ Заполнение таблицы в разделе 2.1 """
     plan: EducationPlan = context['plan']
     table: Table = template.get_docx().tables[3]
-    for subject in sorted(plan.subject_codes.values(), key=Subject.repr):
-        add_table_rows(table, 1)
-        row_index = len(table.rows) - 1
+    subjects = sorted(plan.subject_codes.values(), key=Subject.repr)
+    row_index = add_table_rows(table, len(subjects)) - 1
+    for subject in subjects:
+        row_index += 1
         set_cell_text(table, row_index, 0, word_doc.CENTER, subject.code)
         set_cell_text(table, row_index, 1, word_doc.JUSTIFY, subject.name)
 
@@ -157,9 +117,10 @@ def fill_section_2_2(template: DocxTemplate, context: Dict[str, any]) -> None:
             break
 
     plan: EducationPlan = context['plan']
+    index: RpdIndex = context['rpd_index']
     subjects = sorted(plan.subject_codes.values(), key=Subject.repr)
     for subj in subjects:
-        rpd = get_rpd(subj.name)
+        rpd = index.find(subj.code, subj.name)
         if not rpd:
             continue
 
@@ -169,96 +130,89 @@ def fill_section_2_2(template: DocxTemplate, context: Dict[str, any]) -> None:
         for run in paragraph.runs:
             run.bold = True
 
-        for item in iterate_items(Document(rpd)):
-            if isinstance(item, Paragraph):
-                paragraph = marker.insert_paragraph_before(item.text)
-                paragraph.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-                paragraph.paragraph_format.first_line_indent = Cm(0)
+        for text in index.get(rpd).paragraphs:
+            paragraph = marker.insert_paragraph_before(text)
+            paragraph.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+            paragraph.paragraph_format.first_line_indent = Cm(0)
 
 
 def fill_table_4(template: DocxTemplate, context: Dict[str, any]) -> None:
     """ Заполнение бланка "Лист сформированности компетенций" """
     plan: EducationPlan = context['plan']
     table: Table = template.get_docx().tables[-1]
+    competences = sorted(plan.competence_codes.values(), key=Competence.repr)
+    rows_count = sum(1 + len(competence.subjects) for competence in competences) + 2  # и еще практики и НИР
+    row_index = add_table_rows(table, rows_count) - 1
     row_number = 0
-    for competence in sorted(plan.competence_codes.values(), key=Competence.repr):
-        add_table_rows(table, 1)
-        row_index = len(table.rows) - 1
+    for competence in competences:
+        row_index += 1
         row_number += 1
         set_cell_text(table, row_index, 0, word_doc.CENTER, str(row_number))
         set_cell_text(table, row_index, 1, word_doc.JUSTIFY, competence.code + ' ' + competence.description)
         subjects = [plan.subject_codes[s] for s in competence.subjects]
         for subject in sorted(subjects, key=Subject.repr):
-            add_table_rows(table, 1)
-            row_index = len(table.rows) - 1
+            row_index += 1
             set_cell_text(table, row_index, 1, word_doc.JUSTIFY, subject.code + ' ' + subject.name)
 
-    add_table_rows(table, 1)
+    row_index += 1
     row_number += 1
-    row_index = len(table.rows) - 1
     set_cell_text(table, row_index, 0, word_doc.CENTER, str(row_number))
     set_cell_text(table, row_index, 1, word_doc.JUSTIFY, 'Практики')
 
-    add_table_rows(table, 1)
+    row_index += 1
     row_number += 1
-    row_index = len(table.rows) - 1
     set_cell_text(table, row_index, 0, word_doc.CENTER, str(row_number))
     set_cell_text(table, row_index, 1, word_doc.JUSTIFY, 'НИР')
 
 
-def get_rpd_dict(plan: EducationPlan, rpd_dir: str) -> Dict[str, core.RPD]:
+def get_rpd_dict(plan: EducationPlan, index: RpdIndex, workers: int = None) -> Dict[str, core.RPD]:
+    """
+    Результаты обучения по компетенциям из всех РПД индекса: код дисциплины -> РПД.
+    Новые и измененные РПД разбираются в workers процессах, ошибки выводятся по каждому файлу
+    """
     result = {}
-    for filename in os.listdir(rpd_dir):
-        if filename.startswith('~'):
-            continue
-        if not filename.endswith('.docx'):
+    records = index.get_all(workers)
+    for filename, error in index.errors.items():
+        print(f'Не могу прочитать РПД {filename}: {error}')
+    for filename, record in records.items():
+        if ' ' not in filename:
+            print(f'Не могу прочитать РПД {filename}: в имени файла нет кода дисциплины')
             continue
         code, name = tuple(filename.split(' ', 1))
-        full_path = os.path.join(rpd_dir, filename)
-        rpd_doc = Document(full_path)
-        comp_list, zuv_list = [], []
-        for table in rpd_doc.tables:
-            if len(table.columns) != 5:
-                continue
-            words = 'Планируемые результаты обучения по дисциплине'.split()
-            if all(map(lambda word: word in table.cell(0, 3).text, words)):
-                for cell in list(table.column_cells(1))[1:]:
-                    comp_list.append(cell.text)
-                for cell in list(table.column_cells(3))[1:]:
-                    zuv_list.append(cell.text)
-        if len(comp_list) == len(zuv_list):
-            competences = {}
-            for comp, zuv_str in zip(comp_list, zuv_list):
-                comp_words = comp.split()
-                if comp_words:
-                    comp_code = comp_words[0]
-                    if comp_code.endswith('.') or comp_code.endswith(':'):
-                        comp_code = comp_code[:-1]
-                    competences[comp_code] = core.get_zuv(zuv_str)
-            result[code] = core.RPD(code=code, name=name, zuv=core.ZUV(), competences=competences)
-        # elif len(zuv_list) == 1:
-        #     print(filename, core.get_zuv(zuv_list[0]))
-        #     zuv = core.ZUV()
-        #     result[code] = core.RPD(code=code, name=name, )
-        else:
-            print(filename)
+        competences = {}
+        for comp, zuv_str in record.competences:
+            comp_words = comp.split()
+            if comp_words:
+                comp_code = comp_words[0]
+                if comp_code.endswith('.') or comp_code.endswith(':'):
+                    comp_code = comp_code[:-1]
+                competences[comp_code] = core.get_zuv(zuv_str)
+        result[code] = core.RPD(code=code, name=name, zuv=core.ZUV(), competences=competences)
     return result
 
 
 def main(args: Namespace) -> None:
     """ Точка входа """
-    plan = get_plan(args.plan)
-    rpd_dict = get_rpd_dict(plan, args.rpd_dir)
-    template = word_doc.get_template('fos.docx')
+    with profiling.stage('plan'):
+        plan = get_plan(args.plan, not args.no_cache, args.cache_dir).load()
+    index = RpdIndex(args.rpd_dir, not args.no_cache, args.cache_dir)
+    with profiling.stage('get_rpd_dict'):
+        rpd_dict = get_rpd_dict(plan, index, args.workers)
+    with profiling.stage('template'):
+        template = word_doc.get_template('fos.docx')
     context = {
         'plan': plan,
-        'rpd_dict': rpd_dict
+        'rpd_dict': rpd_dict,
+        'rpd_index': index,
     }
-    fill_table_1(template, context)
+    with profiling.stage('fill_table_1'):
+        fill_table_1(template, context)
     # fill_table_2_1(template, context)
     # fill_table_4(template, context)
-    template.render(context)
-    template.save(args.plan[:-4] + '.docx')
+    with profiling.stage('render'):
+        template.render(context)
+    with profiling.stage('save'):
+        template.save(args.plan[:-4] + '.docx')
     print('Partially done')
 
 
@@ -266,4 +220,13 @@ if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('plan', help='PLX-файл РУПа')
     parser.add_argument('rpd_dir', help='каталог РПД')
-    main(parser.parse_args())
+    parser.add_argument('-j', '--workers', type=int, help='Число процессов для разбора РПД')
+    cache.add_arguments(parser)
+    profiling.add_arguments(parser)
+    arguments = parser.parse_args()
+    if arguments.profile:
+        profiling.start()
+    try:
+        main(arguments)
+    finally:
+        profiling.report(arguments.profile)
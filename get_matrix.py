@@ -1,16 +1,21 @@
 """ Генерация матрицы компетенций """
 
+import argparse
 import sys
 import os
-from enigma import Competence, EducationPlan, Subject
+from enigma import Competence, Subject, cache, get_plan, profiling
+from enigma.education_plan import SECTION_COMPETENCES, SECTION_LINKS
 
 
-def main(plan_filename: str) -> None:
+def main(plan_filename: str, use_cache: bool = None, cache_dir: str = None) -> None:
     """ Точка входа """
-    plan = EducationPlan(plan_filename)
+    with profiling.stage('plan'):
+        plan = get_plan(plan_filename, use_cache, cache_dir)
+        # Без кэша часы для матрицы не читаем: компетенции, дисциплины и связи - за один проход
+        plan.load(SECTION_COMPETENCES, SECTION_LINKS)
     competencies = sorted(plan.competence_codes.values(), key=Competence.repr)
     subjects = sorted(plan.subject_codes.values(), key=Subject.repr)
-    with open(plan_filename[:-4] + '.txt', mode='w', encoding='UTF-8') as output_file:
+    with open(plan_filename[:-4] + '.txt', mode='w', encoding='UTF-8') as output_file, profiling.stage('matrix'):
         result = ['', '']
         for competence in competencies:
             result.append(competence.code)
@@ -27,12 +32,19 @@ def main(plan_filename: str) -> None:
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print('Usage:\n\tpython {0} <education_plan>.plx'.format(*sys.argv))
-        sys.exit()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('plan', type=str, help='<education_plan>.plx')
+    cache.add_arguments(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
 
-    if not os.path.isfile(sys.argv[1]):
-        print('{1} not exists'.format(*sys.argv))
+    if not os.path.isfile(args.plan):
+        print('{0} not exists'.format(args.plan))
         sys.exit()
 
-    main(sys.argv[1])
+    if args.profile:
+        profiling.start()
+    try:
+        main(args.plan, not args.no_cache, args.cache_dir)
+    finally:
+        profiling.report(args.profile)
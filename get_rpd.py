@@ -1,22 +1,31 @@
 """ Генерация РПД """
 import argparse
+import contextlib
 import functools
 import glob
+import io
 import os
 import sys
-from operator import itemgetter
-from typing import List, Dict, Any
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
 
-from Levenshtein import distance as levenshtein_d  # pylint: disable=no-name-in-module
 from docx.shared import Mm
 from docx.table import Table, _Row
 from docxtpl import DocxTemplate, InlineImage
 
-from enigma import Course, Competence, EducationPlan, Subject, get_plan, word_doc
-from enigma.education_plan import CT_EXAM, CT_CREDIT, CT_CREDIT_GRADE
+from enigma import (
+    Course, Competence, EducationPlan, Subject, cache, get_plan, load_course, matcher, profiling, scans, word_doc,
+)
+from enigma.build import Manifest, hash_file
+from enigma.plan_diff import SC_ADDED, SC_NAME, SC_REMOVED, SC_SEMESTERS, diff_plans
+from enigma.watch import WATCH_INTERVAL, get_changes, snapshot
+from enigma.education_plan import CT_EXAM, CT_CREDIT, CT_CREDIT_GRADE, load_plan
 from enigma.word_doc import add_table_rows, set_cell_text
 
 IMAGE_KINDS = ('lit', 'title')
+RPD_TEMPLATE = 'rpd.docx'
+RPD_VERSION = 1  # версия генератора для манифеста сборки: увеличивать, если меняется содержимое РПД
 
 
 def fill_table_column(table: Table, row: int, columns: List[int], values: List[Any]) -> None:
@@ -40,20 +49,19 @@ def str_or_dash(value: Any) -> str:
     return str(value) if value else '—'
 
 
-def check_args() -> None:
-    """ Проверка аргументов командной строки """
-    if len(sys.argv) != 3:
-        print('Синтаксис:\n\tpython {0} <руп> <курс>'.format(*sys.argv))
-        sys.exit()
+class GenerationError(Exception):
+    """ РПД по курсу не может быть создана: в пакетном режиме остальные курсы продолжают обрабатываться """
 
 
-def get_course(course_filename: str) -> Course:
-    """ Открываем курс обучения """
+def get_course(course_filename: str, args: argparse.Namespace = None) -> Course:
+    """ Открываем курс обучения: из кэша, если он не отключен в args """
+    options = vars(args) if args is not None else {}
     try:
-        course = Course(course_filename)
-    except OSError:
-        print('Не могу открыть курс обучения' % course_filename)
-        sys.exit()
+        course = load_course(course_filename, not options.get('no_cache'), options.get('cache_dir'))
+    except OSError as error:
+        raise GenerationError('Не могу открыть курс обучения %s' % course_filename) from error
+    except ValueError as error:
+        raise GenerationError(str(error)) from error
     return course
 
 
@@ -61,8 +69,7 @@ def get_subject(plan: EducationPlan, course: Course) -> Subject:
     """ Ищем подходящую дисциплину в учебном плане """
     result = plan.find_subject(course.names)
     if result is None:
-        print('Не могу найти подходящую дисциплину в учебном плане')
-        sys.exit()
+        raise GenerationError('Не могу найти подходящую дисциплину в учебном плане')
     return result
 
 
@@ -332,10 +339,11 @@ def remove_extra_table_5(template: DocxTemplate, context: Dict[str, Any]):
         word_doc.remove_table(template, exam_table)
 
 
-def get_images(template: DocxTemplate, subject: Subject, args: argparse.Namespace) -> Dict[str, List[InlineImage]]:
+def find_images(subject: Subject, args: argparse.Namespace) -> Dict[str, List[str]]:
     """
-    Поиск картинок, типы которых перечислены в IMAGE_KINDS, например,
-    литературы или титульных листов. Папки для поиска указывается в args
+    Поиск файлов картинок, типы которых перечислены в IMAGE_KINDS, например,
+    литературы или титульных листов. Папки для поиска указывается в args,
+    каждая индексируется один раз за запуск (см. enigma.matcher)
     """
     images = {}
     for kind in IMAGE_KINDS:
@@ -344,42 +352,92 @@ def get_images(template: DocxTemplate, subject: Subject, args: argparse.Namespac
             path = vars(args).get(kind + '_dir')
             if path is None:
                 continue
-            fns = glob.glob(os.path.join(path, '*'))
-            pic_subj = {fn: os.path.splitext(os.path.basename(fn))[0] for fn in fns}
-            distances = [(fn, levenshtein_d(subject.name, pic_subj[fn])) for fn in pic_subj]
-            best = min(distances, key=itemgetter(1))
-            images[kind] += glob.glob(os.path.join(path, pic_subj[best[0]]+'*'))
-            if best[1]/len(subject.name) < 0.4:
+            match = matcher.get_index(path).find(subject.name)
+            if match is None:
+                print(f'Файл(ы) сканов ({kind}) не найдены!')
+                continue
+            images[kind] = match.files
+            if match.distance/len(subject.name) < 0.4:
                 print(f'Найдены файл(ы) сканов ({kind}): ' + ' '.join(images[kind]))
-            elif best[1]/len(subject.name) <= 0.7:
-                print(f'Подозрительный скан ({kind}): {best[0]}')
+            elif match.distance/len(subject.name) <= 0.7:
+                print(f'Подозрительный скан ({kind}): {match.filename}')
             else:
-                print(f'Подходящих сканов не найдено, наименее далекий по имени файл ({kind}): {best[0]}')
+                print(f'Подходящих сканов не найдено, наименее далекий по имени файл ({kind}): {match.filename}')
                 images[kind] = []
-            images[kind] = [InlineImage(template, fn, width=Mm(173)) for fn in sorted(images[kind])]
         except OSError:
             print(f'Файл(ы) сканов ({kind}) не найдены!')
             images[kind] = []
     return images
 
 
-def main(args=None) -> None:
-    """ Точка входа """
-    if args is None:
-        parser = argparse.ArgumentParser()
-        parser.add_argument('plan', type=str, help='PLX-файл РУПа')
-        parser.add_argument('course', type=str, help='YAML-файл курса')
-        parser.add_argument('-t', '--title_dir', type=str, help='Папка со сканами титульных листов')
-        parser.add_argument('-l', '--lit_dir', type=str, help='Папка со сканами литературы')
-        parser.add_argument('-o', '--output_file', type=str, help='Название выходного файла docx')
-        args = parser.parse_args()
+def get_images(template: DocxTemplate, image_files: Dict[str, List[str]],
+               args: argparse.Namespace) -> Dict[str, List[InlineImage]]:
+    """ Картинки для вставки в шаблон по найденным файлам, уменьшенные до размера страницы (см. enigma.scans) """
+    def prepare(filename):
+        if vars(args).get('raw_scans'):
+            return filename
+        return scans.prepare(filename, not vars(args).get('no_cache'), vars(args).get('cache_dir'))
 
-    plan = get_plan(args.plan)
-    course = get_course(args.course)
-    subject = get_subject(plan, course)
-    links_before, links_after = plan.find_dependencies(subject, course)
-    template = word_doc.get_template('rpd.docx')
-    images = get_images(template, subject, args)
+    return {
+        kind: [InlineImage(template, prepare(fn), width=Mm(scans.PRINT_WIDTH_MM)) for fn in files]
+        for kind, files in image_files.items()
+    }
+
+
+def get_inputs(plan: EducationPlan, course_filename: str, image_files: Dict[str, List[str]],
+               args: argparse.Namespace) -> Dict[str, str]:
+    """ Входы РПД для манифеста сборки: название входа -> хэш содержимого """
+    inputs = {
+        'generator': str(RPD_VERSION),
+        'plan': hash_file(plan.filename),
+        'course': hash_file(course_filename),
+        'template': hash_file(os.path.join(word_doc.TEMPLATES_DIR, RPD_TEMPLATE)),
+        'scans': 'raw' if vars(args).get('raw_scans') else scans.get_profile(),
+    }
+    for kind, files in image_files.items():
+        for filename in files:
+            inputs[f'{kind}:{os.path.basename(filename)}'] = hash_file(filename)
+    return inputs
+
+
+def get_output_file(course_filename: str, output_file: str = None, output_dir: str = None) -> str:
+    """ Имя выходного файла: заданное явно, а по умолчанию - как у курса, в каталоге output_dir или рядом с курсом """
+    if output_file:
+        return output_file if output_file.endswith('.docx') else output_file + '.docx'
+    output_file = course_filename.replace('.yaml', '.docx')
+    if output_dir:
+        output_file = os.path.join(output_dir, os.path.basename(output_file))
+    return output_file
+
+
+def generate(plan: EducationPlan, course_filename: str, output_file: str, args: argparse.Namespace,
+             manifest: Manifest = None) -> bool:
+    """
+    Создать РПД по курсу и уже прочитанному учебному плану; при ошибке - GenerationError.
+    Если передан манифест сборки и входы РПД с прошлой сборки не изменились, файл
+    не пересоздается. Возвращает True, если РПД была создана
+    """
+    with profiling.stage('course'):
+        course = get_course(course_filename, args)
+    with profiling.stage('subject'):
+        subject = get_subject(plan, course)
+    with profiling.stage('scans'):
+        image_files = find_images(subject, args)
+    with profiling.stage('manifest'):
+        try:
+            inputs = get_inputs(plan, course_filename, image_files, args)
+        except OSError as error:
+            raise GenerationError(f'Не могу прочитать входной файл {error.filename}') from error
+        if manifest is not None and manifest.is_fresh(output_file, inputs):
+            print(f'Файл {output_file} не изменился с прошлой сборки, пропускаем')
+            return False
+
+    with profiling.stage('dependencies'):
+        links_before, links_after = plan.find_dependencies(subject, course)
+    with profiling.stage('template'):
+        template = word_doc.get_template(RPD_TEMPLATE)
+    with profiling.stage('images'):
+        images = get_images(template, image_files, args)
 
     context = {
         'course': course,
@@ -391,26 +449,276 @@ def main(args=None) -> None:
     for kind in IMAGE_KINDS:
         context[kind + '_images'] = images[kind]
 
-    fill_table_1_2(template, context)
-    fill_table_2(template, context)
-    fill_table_3_1(template, context)
-    fill_table_4(template, context)
-    fill_table_6_1(template, context)
-    fill_table_6_2(template, context)
-    fill_table_7(template, context)
-    remove_extra_table_5(template, context)
-
-    template.render(context)
-    output_file = args.course.replace('.yaml', '.docx')
-    if args.output_file:
-        output_file = args.output_file
-        if not output_file.endswith('.docx'):
-            output_file += '.docx'
+    fills = (
+        fill_table_1_2, fill_table_2, fill_table_3_1, fill_table_4,
+        fill_table_6_1, fill_table_6_2, fill_table_7, remove_extra_table_5,
+    )
+    for fill in fills:
+        with profiling.stage(fill.__name__):
+            fill(template, context)
+
+    with profiling.stage('render'):
+        template.render(context)
     try:
-        template.save(output_file)
+        with profiling.stage('save'):
+            template.save(output_file)
         print(f'Файл {output_file} успешно сохранен')
-    except OSError:
-        print(f'Ошибка при сохранении файла {output_file}!')
+    except OSError as error:
+        raise GenerationError(f'Ошибка при сохранении файла {output_file}!') from error
+    if manifest is not None:
+        manifest.record(output_file, inputs)
+    return True
+
+
+# Учебный план, аргументы и манифест сборки в процессе пула пакетного режима: передаются один раз при его запуске
+_worker_plan: EducationPlan = None
+_worker_args: argparse.Namespace = None
+_worker_manifest: Manifest = None
+
+
+def init_worker(plan: EducationPlan, args: argparse.Namespace, manifest: Manifest = None) -> None:
+    """ Запомнить учебный план в процессе пула """
+    global _worker_plan, _worker_args, _worker_manifest  # pylint: disable=global-statement
+    _worker_plan, _worker_args, _worker_manifest = plan, args, manifest
+    if vars(args).get('profile'):
+        profiling.start()
+
+
+class JobResult(NamedTuple):
+    """ Результат задания пула """
+    log: str  # перехваченный вывод
+    output_file: str
+    error: str = ''  # текст ошибки, пустой - если ошибки не было
+    built: bool = False  # РПД создана, а не пропущена по манифесту сборки
+    record: Optional[Dict[str, str]] = None  # запись манифеста сборки, если РПД создана
+    profile: Dict[str, Any] = None  # замеры стадий, если включен --profile
+
+
+def generate_job(course_filename: str, output_file: str) -> JobResult:
+    """
+    Задание пула: создать одну РПД. Вывод перехватывается, чтобы сообщения
+    разных курсов не перемешивались. Манифест процесса пула - копия, поэтому
+    запись о созданной РПД возвращается вместе с результатом
+    """
+    log = io.StringIO()
+    error, built = '', False
+    with contextlib.redirect_stdout(log), profiling.document(course_filename):
+        try:
+            built = generate(_worker_plan, course_filename, output_file, _worker_args, _worker_manifest)
+        except GenerationError as exc:
+            error = str(exc)
+        except Exception as exc:  # pylint: disable=broad-except
+            error = f'{type(exc).__name__}: {exc}'
+    record = _worker_manifest.get(output_file) if built and _worker_manifest is not None else None
+    return JobResult(log.getvalue(), output_file, error, built, record, profiling.pop_document())
+
+
+def get_course_files(paths: List[str]) -> List[str]:
+    """ Файлы курсов: перечисленные явно и все *.yaml из перечисленных каталогов """
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            result += sorted(glob.glob(os.path.join(path, '*.yaml')))
+        else:
+            result.append(path)
+    return result
+
+
+def generate_batch(plan: EducationPlan, course_files: List[str], args: argparse.Namespace,
+                   workers: int = None, manifest: Manifest = None) -> Dict[str, str]:
+    """
+    Создать РПД по многим курсам одного учебного плана. План разбирается один раз
+    и передается процессам пула при запуске. С манифестом сборки пересоздаются только
+    РПД с изменившимися входами. Печатает итог по каждому курсу и возвращает словарь
+    ошибок: файл курса -> текст ошибки
+    """
+    output_dir = vars(args).get('output_dir')
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    jobs = [(course, get_output_file(course, output_dir=output_dir)) for course in course_files]
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) if jobs else 1
+
+    if workers == 1:
+        init_worker(plan, args, manifest)
+        results = [generate_job(*job) for job in jobs]
+    else:
+        plan.load()  # процессам пула план нужен целиком
+        initargs = (plan, args, manifest)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as executor:
+            results = list(executor.map(generate_job, *zip(*jobs)))
+
+    errors, skipped = {}, set()
+    for (course, _), result in zip(jobs, results):
+        print(f'--- {course}')
+        print(result.log, end='')
+        if result.built:
+            profiling.add_document(result.profile)
+        if result.error:
+            print(f'ОШИБКА: {result.error}')
+            errors[course] = result.error
+        elif not result.built:
+            skipped.add(course)
+        elif manifest is not None:
+            manifest.set(result.output_file, result.record)
+    if manifest is not None:
+        manifest.save()
+
+    print('\nИтого:')
+    for course, output_file in jobs:
+        if course in errors:
+            status = f'ОШИБКА: {errors[course]}'
+        elif course in skipped:
+            status = f'{output_file} (без изменений)'
+        else:
+            status = output_file
+        print(f'  {course}: {status}')
+    print(f'Создано РПД: {len(jobs) - len(errors) - len(skipped)}, без изменений: {len(skipped)}, '
+          f'с ошибками: {len(errors)}')
+    return errors
+
+
+def get_jobs(courses: List[str], args: argparse.Namespace) -> List[Tuple[str, str]]:
+    """ Пары (файл курса, выходной файл); для одного курса учитывается args.output_file """
+    output_dir = vars(args).get('output_dir')
+    if len(courses) == 1 and not os.path.isdir(courses[0]):
+        return [(courses[0], get_output_file(courses[0], vars(args).get('output_file'), output_dir))]
+    return [(course, get_output_file(course, output_dir=output_dir)) for course in get_course_files(courses)]
+
+
+def rebase_plan(old_plan: EducationPlan, new_plan: EducationPlan, jobs: List[Tuple[str, str]],
+                args: argparse.Namespace, manifest: Manifest) -> None:
+    """
+    Перенести на новую версию плана записи манифеста РПД, которых изменения плана
+    не касаются, чтобы они не пересоздавались. Если дисциплины добавились, удалились,
+    переименовались или переехали в другие семестры, меняются поиск дисциплин по курсам
+    и списки связанных дисциплин, поэтому тогда пересоздается все
+    """
+    diff = diff_plans(old_plan, new_plan)
+    structural = {SC_ADDED, SC_REMOVED, SC_NAME, SC_SEMESTERS}
+    if diff.header or any(changes & structural for changes in diff.subjects.values()):
+        return
+    affected = diff.affected_subjects(new_plan)
+    plan_hash = hash_file(new_plan.filename)
+    for course_filename, output_file in jobs:
+        record = manifest.get(output_file)
+        if not record or record.get('plan') == plan_hash:
+            continue
+        try:
+            subject = get_subject(new_plan, get_course(course_filename, args))
+        except GenerationError:
+            continue
+        if subject.code not in affected:
+            manifest.set(output_file, dict(record, plan=plan_hash))
+
+
+def watch(plan: EducationPlan, courses: List[str], args: argparse.Namespace, manifest: Manifest) -> None:
+    """
+    Следить за планом, курсами, шаблоном и каталогами сканов и пересоздавать затронутые
+    изменениями РПД. План, прототип шаблона и индексы сканов все время остаются в памяти
+    """
+    def get_snapshot():
+        files = [args.plan, os.path.join(word_doc.TEMPLATES_DIR, RPD_TEMPLATE)]
+        scan_dirs = [vars(args).get(kind + '_dir') for kind in IMAGE_KINDS]
+        return {
+            **snapshot(files),
+            **snapshot(courses, '*.yaml'),
+            **snapshot(path for path in scan_dirs if path),
+        }
+
+    def build():
+        init_worker(plan, args, manifest)
+        for course_filename, output_file in get_jobs(courses, args):
+            result = generate_job(course_filename, output_file)
+            if result.built:
+                profiling.add_document(result.profile)
+            if result.built or result.error:
+                print(result.log, end='')
+            if result.error:
+                print(f'ОШИБКА ({course_filename}): {result.error}')
+        manifest.save()
+
+    if vars(args).get('output_dir'):
+        os.makedirs(args.output_dir, exist_ok=True)
+    plan.load()
+    build()
+    manifest.force = False  # ключ -B действует только на первую сборку
+    state = get_snapshot()
+    print('Слежу за изменениями, Ctrl+C - выход')
+    try:
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            new_state = get_snapshot()
+            changes = get_changes(state, new_state)
+            if not changes:
+                continue
+            state = new_state
+            if os.path.abspath(args.plan) in changes:
+                # План может быть еще не дописан: тогда остаемся на прежнем и ждем следующего изменения.
+                # Собирать РПД по прежнему плану незачем - манифест все равно учитывает новый файл
+                _, new_plan, error = load_plan(args.plan, not vars(args).get('no_cache'), vars(args).get('cache_dir'))
+                if new_plan is None:
+                    print(f'Не могу прочитать учебный план {args.plan}: {error}')
+                    continue
+                new_plan.filename = args.plan  # снимок из кэша мог быть сделан с копии файла
+                rebase_plan(plan, new_plan, get_jobs(courses, args), args, manifest)
+                plan = new_plan
+            build()
+    except KeyboardInterrupt:
+        print('Слежение остановлено')
+
+
+def main(args=None) -> None:
+    """ Точка входа """
+    if args is None:
+        parser = argparse.ArgumentParser()
+        parser.add_argument('plan', type=str, help='PLX-файл РУПа')
+        parser.add_argument('course', type=str, nargs='+', help='YAML-файл(ы) курсов или каталог с ними')
+        parser.add_argument('-t', '--title_dir', type=str, help='Папка со сканами титульных листов')
+        parser.add_argument('-l', '--lit_dir', type=str, help='Папка со сканами литературы')
+        parser.add_argument('-o', '--output_file', type=str, help='Название выходного файла docx (для одного курса)')
+        parser.add_argument('-d', '--output_dir', type=str, help='Каталог выходных файлов (для нескольких курсов)')
+        parser.add_argument('-j', '--workers', type=int, help='Число процессов для нескольких курсов')
+        parser.add_argument('-B', '--force', action='store_true',
+                            help='Пересоздать все РПД, даже если их входы не изменились')
+        parser.add_argument('--raw-scans', action='store_true', help='Вставлять сканы без уменьшения и пересжатия')
+        parser.add_argument('-w', '--watch', action='store_true',
+                            help='Следить за изменениями входов и пересоздавать затронутые РПД')
+        cache.add_arguments(parser)
+        profiling.add_arguments(parser)
+        args = parser.parse_args()
+
+    if vars(args).get('profile'):
+        profiling.start()
+    try:
+        run(args)
+    finally:
+        profiling.report(vars(args).get('profile'))
+
+
+def run(args: argparse.Namespace) -> None:
+    """ Создать РПД по аргументам командной строки """
+    with profiling.stage('plan'):
+        plan = get_plan(args.plan, not vars(args).get('no_cache'), vars(args).get('cache_dir')).load()
+    manifest = Manifest(force=bool(vars(args).get('force')))
+
+    # Один курс - прежний режим, в том числе при вызове из других скриптов с готовыми args
+    courses = args.course if isinstance(args.course, list) else [args.course]
+    if vars(args).get('watch'):
+        watch(plan, courses, args, manifest)
+        return
+    if len(courses) == 1 and not os.path.isdir(courses[0]):
+        output_file = get_output_file(courses[0], args.output_file, vars(args).get('output_dir'))
+        try:
+            with profiling.document(courses[0]):
+                generate(plan, courses[0], output_file, args, manifest)
+        except GenerationError as error:
+            print(error)
+            sys.exit(1)
+        manifest.save()
+        return
+
+    if generate_batch(plan, get_course_files(courses), args, vars(args).get('workers'), manifest):
+        sys.exit(1)
 
 
 if __name__ == '__main__':
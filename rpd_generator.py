@@ -4,43 +4,59 @@ import unicodedata
 import yaml
 import pandas as pd
 
-from get_rpd import main
+from enigma import get_plan, profiling
+from enigma.build import Manifest
+from get_rpd import generate_batch
 
-filename = 'courses/tpl.yaml'
-with open(filename, encoding='UTF-8') as input_file:
-    try:
-        data = yaml.load(input_file, Loader=yaml.CLoader)
-    except AttributeError:
-        data = yaml.load(input_file, Loader=yaml.Loader)
-for name in data['названия']:
-    for i, word in enumerate(name):
-        name[i] = unicodedata.normalize('NFC', word)
-
-XLS_FILE = 'inputs/G09040101_20-12ИВТ.plx.xls'
-df = pd.read_excel(XLS_FILE, sheet_name='План')
-df.iloc[1][-2] = 'Кафедра'
-df.columns = df.iloc[1].values
-df = df[~df['Наименование'].isna() & ~df['Компетенции'].isna()][['Индекс', 'Наименование']]
-
-for i, row in df.iterrows():
-    if i < 10:
-        continue
-    if i > 41:
-        break
-    name = unicodedata.normalize('NFC', row['Наименование'])
-    data['названия'] = [name.lower().split()]
-    fn = f'courses/{row["Индекс"]} {name}.yaml'
-    with open(fn, 'w', encoding='utf-8') as output_file:
-        yaml.safe_dump(data, output_file, allow_unicode=True)
+PLAN_FILE = 'inputs/G09040101_20-12ИВТ.plx'
+XLS_FILE = PLAN_FILE + '.xls'
+
+
+def main() -> None:
+    """ Создать курсы по выписке из РУПа и РПД по ним """
+    filename = 'courses/tpl.yaml'
+    with open(filename, encoding='UTF-8') as input_file:
+        try:
+            data = yaml.load(input_file, Loader=yaml.CLoader)
+        except AttributeError:
+            data = yaml.load(input_file, Loader=yaml.Loader)
+    for name in data['названия']:
+        for i, word in enumerate(name):
+            name[i] = unicodedata.normalize('NFC', word)
+
+    df = pd.read_excel(XLS_FILE, sheet_name='План')
+    df.iloc[1][-2] = 'Кафедра'
+    df.columns = df.iloc[1].values
+    df = df[~df['Наименование'].isna() & ~df['Компетенции'].isna()][['Индекс', 'Наименование']]
 
+    course_files = []
+    for i, row in df.iterrows():
+        if i < 10:
+            continue
+        if i > 41:
+            break
+        name = unicodedata.normalize('NFC', row['Наименование'])
+        data['названия'] = [name.lower().split()]
+        fn = f'courses/{row["Индекс"]} {name}.yaml'
+        with open(fn, 'w', encoding='utf-8') as output_file:
+            yaml.safe_dump(data, output_file, allow_unicode=True)
+        course_files.append(fn)
+
+    # План разбирается один раз, РПД создаются параллельно в пуле процессов
     parser = argparse.ArgumentParser()
-    
-    parser.add_argument('plan', type=str, help='PLX-файл РУПа')
-    parser.add_argument('course', type=str, help='YAML-файл курса')
-    parser.add_argument('-t', '--title_dir', type=str, help='Папка со сканами титульных листов')
-    parser.add_argument('-l', '--lit_dir', type=str, help='Папка со сканами литературы')
-    parser.add_argument('-o', '--output_file', type=str, help='Название выходного файла docx')
-    
-    args = parser.parse_args(['inputs/G09040101_20-12ИВТ.plx', fn, '-l', 'liter2', '-t', 'titles/cuts'])
-
-    main(args)
+    parser.add_argument('-j', '--workers', type=int, help='Число процессов')
+    parser.add_argument('-B', '--force', action='store_true', help='Пересоздать все РПД, даже если курс не изменился')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    args.title_dir, args.lit_dir, args.output_dir = 'titles/cuts', 'liter2', None
+    if args.profile:
+        profiling.start()
+    try:
+        generate_batch(get_plan(PLAN_FILE), course_files, args, args.workers, Manifest(force=args.force))
+    finally:
+        profiling.report(args.profile)
+
+
+# Без этой проверки процессы пула в Windows заново выполняли бы весь скрипт
+if __name__ == '__main__':
+    main()
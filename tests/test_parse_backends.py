@@ -0,0 +1,62 @@
+"""
+Разборщики XML учебного плана (стандартная библиотека и lxml) дают одинаковые планы
+"""
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import Scale, write_plan
+from enigma.education_plan import (
+    BACKEND_ETREE, BACKEND_LXML, SECTIONS, EducationPlan, iter_plan_etree, iter_plan_lxml, lxml_etree,
+)
+
+pytestmark = pytest.mark.skipif(lxml_etree is None, reason='lxml не установлен')
+
+
+@pytest.fixture(name='plan_filename', scope='module')
+def fixture_plan_filename(tmp_path_factory):
+    """ Синтетический план из benchmarks/synthetic.py """
+    filename = str(tmp_path_factory.mktemp('plan') / 'plan.plx')
+    write_plan(filename, Scale())
+    return filename
+
+
+def get_state(value):
+    """ Значение атрибута плана в сравнимом виде, без обратных ссылок на план """
+    if isinstance(value, EducationPlan):
+        return None
+    if isinstance(value, np.ndarray):
+        return value.dtype.str, value.shape, value.tobytes()
+    if isinstance(value, dict):
+        return {key: get_state(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [get_state(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if hasattr(value, '__dict__'):
+        return type(value).__name__, get_state(vars(value))
+    return value
+
+
+def get_sections(plan: EducationPlan):
+    """ Загруженные разделы плана """
+    return {attr: get_state(value) for attr, value in vars(plan).items() if attr not in ('filename', 'backend')}
+
+
+def test_rows_match(plan_filename):
+    etree_rows = [(tag, dict(attrs)) for tag, _, attrs in iter_plan_etree(plan_filename)]
+    lxml_rows = [(tag, dict(attrs)) for tag, _, attrs in iter_plan_lxml(plan_filename)]
+    assert etree_rows and etree_rows == lxml_rows
+
+
+@pytest.mark.parametrize('section', SECTIONS)
+def test_section_matches(plan_filename, section):
+    reference = EducationPlan(plan_filename, BACKEND_ETREE).load(section)
+    plan = EducationPlan(plan_filename, BACKEND_LXML).load(section)
+    assert get_sections(plan) == get_sections(reference)
+
+
+def test_plan_matches(plan_filename):
+    reference = EducationPlan(plan_filename, BACKEND_ETREE).load()
+    plan = EducationPlan(plan_filename, BACKEND_LXML).load()
+    assert reference.subject_keys and reference.competence_keys
+    assert get_sections(plan) == get_sections(reference)
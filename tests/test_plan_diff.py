@@ -0,0 +1,57 @@
+"""
+Сравнение версий плана (enigma.plan_diff) находит строки ФОС, которые нужно пересоздать
+"""
+import re
+
+import pytest
+
+from benchmarks.synthetic import Scale, write_plan
+from enigma.education_plan import EducationPlan
+from enigma.plan_diff import SC_COMPETENCIES, SC_REMOVED, diff_plans
+
+SUBJECT_CODE = 'Б1.О.01'  # дисциплина вне групп: ее компетенции - только ее собственные связи
+
+
+@pytest.fixture(name='plan_filename')
+def fixture_plan_filename(tmp_path):
+    """ Синтетический план из benchmarks/synthetic.py """
+    filename = str(tmp_path / 'plan.plx')
+    write_plan(filename, Scale())
+    return filename
+
+
+def write_without(filename: str, new_filename: str, pattern: str) -> None:
+    """ Копия плана без строк, подходящих под регулярное выражение """
+    with open(filename, encoding='utf-8') as input_file:
+        lines = input_file.readlines()
+    with open(new_filename, 'w', encoding='utf-8') as output_file:
+        output_file.writelines(line for line in lines if not re.search(pattern, line))
+
+
+def test_removed_link(plan_filename, tmp_path):
+    old = EducationPlan(plan_filename).load()
+    subject = old.subject_codes[SUBJECT_CODE]
+    competence = old.competence_codes[sorted(subject.competencies)[0]]
+    keys = '|'.join([competence.key, *competence.indicator_keys])
+    new_filename = str(tmp_path / 'new.plx')
+    write_without(plan_filename, new_filename, f'<ПланыКомпетенцииДисциплины .*КодСтроки="{subject.key}" '
+                                               f'КодКомпетенции="({keys})"')
+
+    new = EducationPlan(new_filename).load()
+    assert competence.code not in new.subject_codes[SUBJECT_CODE].competencies
+    diff = diff_plans(old, new)
+    assert diff.subjects[SUBJECT_CODE] == {SC_COMPETENCIES}
+    assert competence.code in diff.affected_competences(new)
+
+
+def test_removed_subject(plan_filename, tmp_path):
+    old = EducationPlan(plan_filename).load()
+    subject = old.subject_codes[SUBJECT_CODE]
+    new_filename = str(tmp_path / 'new.plx')
+    write_without(plan_filename, new_filename, f'(<ПланыСтроки Код|КодСтроки|КодОбъекта)="{subject.key}"')
+
+    new = EducationPlan(new_filename).load()
+    assert SUBJECT_CODE not in new.subject_codes
+    diff = diff_plans(old, new)
+    assert diff.subjects[SUBJECT_CODE] == {SC_REMOVED}
+    assert subject.competencies and subject.competencies <= diff.affected_competences(new)
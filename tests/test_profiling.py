@@ -0,0 +1,46 @@
+"""
+Пики памяти вложенных стадий замеров (enigma.profiling)
+"""
+import tracemalloc
+
+import pytest
+
+from enigma.profiling import Profiler
+
+MB = 2**20
+
+
+@pytest.fixture(name='profiler')
+def fixture_profiler():
+    """ Профайлер с включенным tracemalloc """
+    tracemalloc.start()
+    yield Profiler()
+    tracemalloc.stop()
+
+
+def test_outer_peak_before_nested_stage(profiler):
+    with profiler.stage('outer'):
+        data = bytearray(50 * MB)
+        del data
+        with profiler.stage('inner'):
+            pass
+    assert profiler.stages['outer']['peak'] >= 50 * MB
+    assert profiler.stages['inner']['peak'] < MB
+
+
+def test_outer_peak_includes_nested_stage(profiler):
+    with profiler.stage('outer'):
+        with profiler.stage('inner'):
+            data = bytearray(20 * MB)
+            del data
+    assert profiler.stages['inner']['peak'] >= 20 * MB
+    assert profiler.stages['outer']['peak'] >= 20 * MB
+
+
+def test_document_peak(profiler):
+    with profiler.document('doc'):
+        data = bytearray(30 * MB)
+        del data
+        with profiler.stage('render'):
+            pass
+    assert profiler.documents[0]['peak'] >= 30 * MB
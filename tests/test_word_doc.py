@@ -0,0 +1,48 @@
+"""
+Копии шаблона из кэша (enigma.word_doc.get_template) не влияют друг на друга
+"""
+import zipfile
+
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+
+from enigma import word_doc
+
+FOOTNOTE = '<w:footnote w:id="1"><w:p><w:r><w:t>{{ note }}</w:t></w:r></w:p></w:footnote></w:footnotes>'
+
+
+def make_template(path):
+    """ Шаблон ФОС с тегами в заголовке документа, тексте и сноске """
+    document = Document('templates/fos.docx')
+    body = document.element.body
+    for child in list(body)[:-1]:  # последний - свойства раздела
+        body.remove(child)
+    document.add_paragraph('{{ title }}')
+    document.core_properties.title = '{{ title }}'
+    footnotes = document.part.part_related_by(RT.FOOTNOTES)
+    footnotes._blob = footnotes.blob.replace(b'</w:footnotes>', FOOTNOTE.encode())  # pylint: disable=protected-access
+    document.save(path)
+
+
+def render(name, context, path):
+    """ Отрисовать копию шаблона и вернуть core.xml и footnotes.xml результата """
+    template = word_doc.get_template(name)
+    template.render(context)
+    template.save(path)
+    with zipfile.ZipFile(path) as archive:
+        return archive.read('docProps/core.xml').decode(), archive.read('word/footnotes.xml').decode()
+
+
+def test_clones_render_independently(tmp_path, monkeypatch):
+    make_template(tmp_path / 'fos.docx')
+    monkeypatch.setattr(word_doc, 'TEMPLATES_DIR', str(tmp_path))
+
+    first = render('fos.docx', {'title': 'Первый', 'note': 'Сноска 1'}, tmp_path / 'first.docx')
+    second = render('fos.docx', {'title': 'Второй', 'note': 'Сноска 2'}, tmp_path / 'second.docx')
+
+    assert '<dc:title>Первый</dc:title>' in first[0] and 'Сноска 1' in first[1]
+    assert '<dc:title>Второй</dc:title>' in second[0] and 'Сноска 2' in second[1]
+    assert first[0] != second[0] and first[1] != second[1]
+
+    prototype = word_doc.get_prototype(str(tmp_path / 'fos.docx'))
+    assert prototype.core_properties.title == '{{ title }}'